@@ -0,0 +1,60 @@
+"""Benchmarks for the 'cp2k_shell' session of 'znlib.atomistic.CP2KNode'
+
+Uses the protocol stand-in 'tests/static/fake_cp2k_shell.py', so only the cost of
+starting the process and loading the input is measured, not the DFT itself.
+
+Run with 'python benchmarks/cp2k_session.py'.
+"""
+import os
+import pathlib
+import sys
+import tempfile
+import timeit
+
+import ase.build
+
+from znlib.atomistic import CP2KNode
+
+FAKE_CP2K_SHELL = pathlib.Path(__file__).parents[1] / "tests/static/fake_cp2k_shell.py"
+
+
+def get_node(n_frames: int = 50) -> CP2KNode:
+    atoms = []
+    for seed in range(n_frames):
+        atom = ase.build.bulk("Si", cubic=True)
+        atom.rattle(seed=seed)
+        atoms.append(atom)
+    node = CP2KNode(atoms=atoms, input_file="cp2k.yaml")
+    node.cp2k_shell = f"{sys.executable} {FAKE_CP2K_SHELL}"
+    return node
+
+
+def new_shell_per_frame(node: CP2KNode, script: str):
+    """The previous behaviour: a new calculator and 'cp2k_shell' for every frame"""
+    for atom in node.atoms:
+        atom = atom.copy()
+        atom.calc = node.get_calculator(script)
+        atom.get_potential_energy()
+        atom.calc.close()
+
+
+def single_session(node: CP2KNode, script: str):
+    """One 'cp2k_shell' session for all frames with 'CP2KNode.compute'"""
+    calculator = None
+    for atom in node.atoms:
+        calculator = node.compute(atom.copy(), script, calculator)
+    calculator.close()
+
+
+def main():
+    node = get_node()
+    script = "&FORCE_EVAL\n&END FORCE_EVAL"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        for runner in [new_shell_per_frame, single_session]:
+            seconds = min(timeit.repeat(lambda: runner(node, script), number=1, repeat=3))
+            print(f"{runner.__name__:<20}: {len(node.atoms) / seconds:8.1f} frames / s")
+
+
+if __name__ == "__main__":
+    main()
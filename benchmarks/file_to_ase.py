@@ -0,0 +1,50 @@
+"""Benchmarks for parsing trajectories in 'znlib.atomistic.FileToASE'
+
+Run with 'python benchmarks/file_to_ase.py [n_workers]'.
+"""
+import os
+import pathlib
+import sys
+import tempfile
+import timeit
+
+import ase.build
+import ase.io
+import numpy as np
+from ase.calculators.singlepoint import SinglePointCalculator
+
+from znlib.atomistic.ase import iread_parallel
+
+
+def write_trajectory(file: pathlib.Path, n_frames: int = 2000, size: int = 3):
+    """Write rattled copper supercells with energies and forces to an extxyz file"""
+    atoms = ase.build.bulk("Cu", cubic=True).repeat(size)
+    frames = []
+    for seed in range(n_frames):
+        frame = atoms.copy()
+        frame.rattle(seed=seed)
+        frame.calc = SinglePointCalculator(
+            frame, energy=float(seed), forces=np.zeros((len(frame), 3))
+        )
+        frames.append(frame)
+    ase.io.write(file, frames, format="extxyz")
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = pathlib.Path(tmp_dir, "trajectory.extxyz")
+        write_trajectory(file)
+        n_frames = sum(1 for _ in ase.io.iread(file))
+        for label, reader in [
+            ("ase.io.iread", lambda: ase.io.iread(file)),
+            (f"iread_parallel({n_workers})", lambda: iread_parallel(file, n_workers)),
+        ]:
+            seconds = min(
+                timeit.repeat(lambda: sum(1 for _ in reader()), number=1, repeat=3)
+            )
+            print(f"{label:<20}: {n_frames / seconds:10.1f} frames / s")
+
+
+if __name__ == "__main__":
+    main()
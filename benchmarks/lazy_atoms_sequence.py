@@ -0,0 +1,62 @@
+"""Benchmarks for 'znlib.atomistic.ase.LazyAtomsSequence'
+
+Run with 'python benchmarks/lazy_atoms_sequence.py'.
+"""
+import pathlib
+import random
+import tempfile
+import timeit
+
+import ase.build
+import ase.db
+
+from znlib.atomistic.ase import LazyAtomsSequence
+
+
+def write_database(file: pathlib.Path, n_frames: int = 2000, size: int = 3):
+    """Write rattled copper supercells to an ASE database"""
+    atoms = ase.build.bulk("Cu", cubic=True).repeat(size)
+    with ase.db.connect(file, append=False) as db:
+        for seed in range(n_frames):
+            frame = atoms.copy()
+            frame.rattle(seed=seed)
+            db.write(frame)
+
+
+def random_access(database: str, n_samples: int = 500, reconnect: bool = False):
+    """Read single random frames without caching
+
+    Parameters
+    ----------
+    reconnect: bool
+        Close the connection before every access to measure the cost of opening a new
+        connection for every cache miss, which was the behaviour before connections
+        were reused.
+    """
+    random.seed(42)
+    with LazyAtomsSequence(database, maxsize=0) as sequence:
+        indices = [random.randrange(len(sequence)) for _ in range(n_samples)]
+        for idx in indices:
+            if reconnect:
+                sequence.close()
+            _ = sequence[idx]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database = pathlib.Path(tmp_dir, "atoms.db")
+        write_database(database)
+        for reconnect in [True, False]:
+            seconds = min(
+                timeit.repeat(
+                    lambda: random_access(database.as_posix(), reconnect=reconnect),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            label = "new connection per access" if reconnect else "persistent connection"
+            print(f"{label:<30}: {500 / seconds:10.1f} frames / s")
+
+
+if __name__ == "__main__":
+    main()
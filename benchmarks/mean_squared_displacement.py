@@ -0,0 +1,38 @@
+"""Benchmarks for the MSD of 'znlib.atomistic.ase.MeanSquaredDisplacement'
+
+Run with 'python benchmarks/mean_squared_displacement.py'.
+"""
+import timeit
+
+import numpy as np
+
+from znlib.atomistic.ase import sum_msd_fft
+
+
+def sum_msd_naive(positions: np.ndarray) -> np.ndarray:
+    """The O(N^2) MSD: one difference of all time origins per lag"""
+    n_frames = len(positions)
+    return np.array(
+        [
+            np.sum((positions[lag:] - positions[: n_frames - lag]) ** 2)
+            / (n_frames - lag)
+            for lag in range(n_frames)
+        ]
+    )
+
+
+def main():
+    rng = np.random.default_rng(42)
+    for n_frames in [1000, 5000, 20000]:
+        positions = np.cumsum(rng.normal(size=(n_frames, 100, 3)), axis=0)
+        engines = [sum_msd_fft] if n_frames > 5000 else [sum_msd_naive, sum_msd_fft]
+        for engine in engines:
+            seconds = min(timeit.repeat(lambda: engine(positions), number=1, repeat=3))
+            print(
+                f"{n_frames:>6} frames x 100 atoms {engine.__name__:<14}:"
+                f" {seconds:8.3f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmarks for the engines of 'znlib.atomistic.ase.RadialDistributionFunction'
+
+Run with 'python benchmarks/radial_distribution_function.py'.
+"""
+import timeit
+
+import ase.build
+import ase.geometry.analysis
+import numpy as np
+
+from znlib.atomistic.ase import RadialDistributionFunction, get_partial_rdfs, get_rdf
+
+
+def get_atoms(size: int) -> ase.Atoms:
+    """Rattled copper supercell with '4 * size**3' atoms"""
+    atoms = ase.build.bulk("Cu", cubic=True).repeat(size)
+    atoms.rattle(0.1, seed=42)
+    return atoms
+
+
+def rdf_ase(atoms: ase.Atoms, rmax: float = 5.0, nbins: int = 100) -> np.ndarray:
+    """The 'ase' engine: full distance matrix"""
+    return ase.geometry.analysis.Analysis(atoms).get_rdf(rmax, nbins)[0]
+
+
+def rdf_numpy(atoms: ase.Atoms, rmax: float = 5.0, nbins: int = 100) -> np.ndarray:
+    """The 'numpy' engine: cell list and 'np.bincount'"""
+    return get_rdf(atoms, rmax, nbins)
+
+
+def all_pairs_separately(atoms: ase.Atoms, rmax: float = 5.0, nbins: int = 100):
+    """One 'get_rdf' call per pair of species"""
+    species = sorted(set(atoms.numbers.tolist()))
+    return [
+        get_rdf(atoms, rmax, nbins, elements=[first, second])
+        for idx, first in enumerate(species)
+        for second in species[idx:]
+    ]
+
+
+def all_pairs_single_pass(atoms: ase.Atoms, rmax: float = 5.0, nbins: int = 100):
+    """All pairs of species from one neighbor search with 'get_partial_rdfs'"""
+    return get_partial_rdfs(atoms, rmax, nbins)
+
+
+def main():
+    # the 'ase' engine needs the full matrix of distance vectors, which is several GB
+    # for 10976 atoms and does not fit into the memory of this machine
+    for size, engines in [
+        (8, [rdf_ase, rdf_numpy]),
+        (14, [rdf_numpy]),
+        (20, [rdf_numpy]),
+    ]:
+        atoms = get_atoms(size)
+        for engine in engines:
+            seconds = min(timeit.repeat(lambda: engine(atoms), number=1, repeat=3))
+            print(
+                f"{len(atoms):>6} atoms {engine.__name__:<10}: {seconds:8.3f} s / frame"
+            )
+
+    # four species give ten pairs
+    atoms = get_atoms(14)
+    atoms.numbers[::2] = 29
+    atoms.numbers[1::4] = 1
+    atoms.numbers[3::8] = 6
+    atoms.numbers[7::8] = 8
+    for engine in [all_pairs_separately, all_pairs_single_pass]:
+        seconds = min(timeit.repeat(lambda: engine(atoms), number=1, repeat=3))
+        print(f"{len(atoms):>6} atoms {engine.__name__:<22}: {seconds:8.3f} s / frame")
+
+    # early stopping on 1000 frames with 500 atoms
+    frames = []
+    for seed in range(1000):
+        frame = get_atoms(5)
+        frame.rattle(0.1, seed=seed)
+        frames.append(frame)
+    for tolerance in [None, 0.02]:
+        rdf = RadialDistributionFunction(
+            data=frames, rmax=4.0, nbins=100, engine="numpy", block_size=20
+        )
+        rdf.tolerance = tolerance
+        seconds = min(timeit.repeat(rdf.run, number=1, repeat=3))
+        print(
+            f"tolerance={tolerance}: {seconds:8.3f} s, max stderr"
+            f" {np.nanmax(rdf.stderr['y']):.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmarks for writing 'znlib.atomistic.ase.ZnAtoms' databases
+
+Run with 'python benchmarks/zn_atoms.py'.
+"""
+import pathlib
+import tempfile
+import timeit
+
+import ase.build
+import ase.db
+import numpy as np
+from ase.calculators.singlepoint import SinglePointCalculator
+
+from znlib.atomistic.ase import write_atoms_to_db
+
+
+def get_atoms(n_frames: int = 5000, size: int = 2) -> list:
+    """Rattled copper supercells with energies and forces"""
+    atoms = ase.build.bulk("Cu", cubic=True).repeat(size)
+    frames = []
+    for seed in range(n_frames):
+        frame = atoms.copy()
+        frame.rattle(seed=seed)
+        frame.calc = SinglePointCalculator(
+            frame, energy=float(seed), forces=np.zeros((len(frame), 3))
+        )
+        frames.append(frame)
+    return frames
+
+
+def write_per_frame(file: pathlib.Path, atoms: list):
+    """The previous writer: one 'db.write' per frame"""
+    with ase.db.connect(file, append=False) as db:
+        for atom in atoms:
+            db.write(atom, group="benchmark")
+
+
+def write_bulk(file: pathlib.Path, atoms: list):
+    """Batched inserts with 'write_atoms_to_db'"""
+    write_atoms_to_db(file, atoms, group="benchmark")
+
+
+def write_streaming(file: pathlib.Path, atoms: list):
+    """Batched inserts from a background thread while the frames are produced"""
+    write_atoms_to_db(
+        file, (atom.copy() for atom in atoms), background=True, group="benchmark"
+    )
+
+
+def main():
+    atoms = get_atoms()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = pathlib.Path(tmp_dir, "atoms.db")
+        for writer in [write_per_frame, write_bulk, write_streaming]:
+            seconds = min(timeit.repeat(lambda: writer(file, atoms), number=1, repeat=3))
+            print(f"{writer.__name__:<20}: {len(atoms) / seconds:10.1f} frames / s")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,9 @@ import pathlib
 import random
 import shutil
 import subprocess
+import sys
 
+import ase.db
 import ase.io
 import pytest
 
@@ -59,6 +61,16 @@ def tetraeder_test_traj(tmp_path_factory) -> str:
     return file.resolve().as_posix()
 
 
+@pytest.fixture
+def tetraeder_test_db(tetraeder_test_traj, tmp_path) -> str:
+    """Write the tetraeder trajectory into an ASE database."""
+    file = tmp_path / "tetraeder.db"
+    with ase.db.connect(file) as db:
+        for atoms in ase.io.iread(tetraeder_test_traj):
+            db.write(atoms)
+    return file.resolve().as_posix()
+
+
 @pytest.fixture()
 def atoms_si8() -> ase.Atoms:
     return ase.Atoms(
@@ -128,3 +140,9 @@ def BASIS_SET() -> pathlib.Path:
 @pytest.fixture()
 def GTH_POTENTIALS() -> pathlib.Path:
     return CWD / "static" / "GTH_POTENTIALS"
+
+
+@pytest.fixture()
+def fake_cp2k_shell() -> str:
+    """Command of a 'cp2k_shell' stand-in, see 'static/fake_cp2k_shell.py'"""
+    return f"{sys.executable} {CWD / 'static' / 'fake_cp2k_shell.py'}"
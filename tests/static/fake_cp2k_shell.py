@@ -0,0 +1,125 @@
+"""A minimal stand-in for 'cp2k_shell' that speaks the protocol used by ASE
+
+The energy is a harmonic potential 'sum(positions**2)' around the origin. Every
+evaluation writes the wavefunction restart file '<PROJECT>-RESTART.wfn' and reports
+an SCF with 5 steps from a previous wavefunction or 10 steps otherwise in the output.
+
+Environment variables
+---------------------
+FAKE_CP2K_SHELL_LOG:
+    Append "start", "LOAD" and "EVAL_EF" for every started process, loaded force
+    environment and evaluation to this file. "RESTART_WFN" follows "LOAD" if the
+    input uses 'SCF_GUESS RESTART' and the restart file exists.
+FAKE_CP2K_SHELL_CRASH:
+    If this file exists and contains the number of "EVAL_EF" in the log, remove it
+    and exit with an error instead of evaluating, like a crashed CP2K process.
+FAKE_CP2K_SHELL_NOT_CONVERGED:
+    Same as FAKE_CP2K_SHELL_CRASH, but report "SCF run NOT converged" instead. The
+    file can contain several numbers separated by whitespace.
+"""
+import os
+import pathlib
+import re
+import sys
+
+import numpy as np
+
+
+def log(message: str) -> int:
+    """Append to the log and return the number of evaluations so far"""
+    file = os.environ.get("FAKE_CP2K_SHELL_LOG")
+    if file is None:
+        return 0
+    with open(file, "a") as handle:
+        handle.write(f"{message}\n")
+    return pathlib.Path(file).read_text().split().count("EVAL_EF")
+
+
+def is_triggered(variable: str, n_evaluations: int) -> bool:
+    """Whether the file in the environment 'variable' contains 'n_evaluations'
+
+    The number is removed from the file and the file is removed once it is empty.
+    """
+    file = os.environ.get(variable)
+    if file is None or not pathlib.Path(file).exists():
+        return False
+    numbers = [int(x) for x in pathlib.Path(file).read_text().split()]
+    if n_evaluations not in numbers:
+        return False
+    numbers.remove(n_evaluations)
+    if len(numbers) == 0:
+        pathlib.Path(file).unlink()
+    else:
+        pathlib.Path(file).write_text(" ".join(map(str, numbers)))
+    return True
+
+
+def send(*lines):
+    for line in lines:
+        print(line, flush=True)
+
+
+def main():
+    log("start")
+    positions = np.zeros((0, 3))
+    force_env = 0
+    project, output, has_wfn = "PROJECT", None, False
+    send("* READY")
+    for line in sys.stdin:
+        command, *arguments = line.split()
+        if command == "VERSION":
+            send("CP2K Shell Version: 6.0")
+        elif command == "WRITE_FILE":
+            file = sys.stdin.readline().strip()
+            content = [sys.stdin.readline() for _ in range(int(sys.stdin.readline()))]
+            assert sys.stdin.readline().strip() == "*END"
+            pathlib.Path(file).write_text("".join(content))
+        elif command == "LOAD":
+            output = pathlib.Path(arguments[1])
+            force_env += 1
+            output.write_text(f"fake cp2k output of force environment {force_env}\n")
+            log("LOAD")
+            content = pathlib.Path(arguments[0]).read_text()
+            project = re.search(r"PROJECT\s+(\S+)", content).group(1)
+            has_wfn = False
+            if re.search(r"SCF_GUESS\s+RESTART", content, flags=re.IGNORECASE):
+                if pathlib.Path(f"{project}-RESTART.wfn").exists():
+                    log("RESTART_WFN")
+                    has_wfn = True
+            send(force_env)
+        elif command == "SET_CELL":
+            _ = [sys.stdin.readline() for _ in range(3)]
+        elif command == "SET_POS":
+            n_values = int(sys.stdin.readline())
+            positions = np.array(
+                [sys.stdin.readline().split() for _ in range(n_values // 3)], dtype=float
+            )
+            assert sys.stdin.readline().strip() == "*END"
+            send("0.0")
+        elif command == "EVAL_EF":
+            n_evaluations = log("EVAL_EF") - 1
+            if is_triggered("FAKE_CP2K_SHELL_CRASH", n_evaluations):
+                sys.exit(1)
+            pathlib.Path(f"{project}-RESTART.wfn").write_text(f"{len(positions)}\n")
+            with output.open("a") as file:
+                if is_triggered("FAKE_CP2K_SHELL_NOT_CONVERGED", n_evaluations):
+                    file.write("  *** SCF run NOT converged ***\n")
+                else:
+                    steps = 5 if has_wfn else 10
+                    file.write(f"  *** SCF run converged in {steps:>6} steps ***\n")
+            has_wfn = True
+        elif command == "GET_E":
+            send(f"{np.sum(positions**2):.18e}")
+        elif command == "GET_F":
+            send(3 * len(positions))
+            send(*(" ".join(f"{x:.18e}" for x in force) for force in -2 * positions))
+            send("* END")
+        elif command == "GET_STRESS":
+            send(" ".join(["0.0"] * 9))
+        elif command == "EXIT":
+            return
+        send("* READY")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
+import concurrent.futures
+import contextlib
 import os
 import pathlib
+import pickle
 import shutil
+import sqlite3
 import subprocess
+import sys
 
+import ase.build
+import ase.constraints
+import ase.db
+import ase.geometry.analysis
 import ase.io
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pytest
 import yaml
+from ase.calculators.singlepoint import SinglePointCalculator
 
 import znlib
 
@@ -104,3 +118,933 @@ def test_i_CP2KNode(proj_path, cp2k_si8_input, atoms_si8, BASIS_SET, GTH_POTENTI
     cp2k_node.write_graph(run=True)
 
     assert cp2k_node.load().outputs[0].get_potential_energy() < 0.0
+
+
+def test_CP2KNode_session(
+    cp2k_si8_input, atoms_si8, tmp_path, fake_cp2k_shell, monkeypatch
+):
+    os.chdir(tmp_path)
+    input_file = pathlib.Path("cp2k.yaml")
+    input_file.write_text(yaml.safe_dump(cp2k_si8_input))
+    monkeypatch.setenv("FAKE_CP2K_SHELL_LOG", "shell.log")
+    # the process crashes at the fourth evaluation
+    pathlib.Path("crash").write_text("3")
+    monkeypatch.setenv("FAKE_CP2K_SHELL_CRASH", "crash")
+
+    atoms = [atoms_si8.copy() for _ in range(6)]
+    for seed, atom in enumerate(atoms):
+        atom.rattle(seed=seed)
+    atoms[4].pbc = atoms[5].pbc = True
+    del atoms[5][0]
+
+    cp2k_node = znlib.atomistic.CP2KNode(input_file=input_file, atoms=atoms)
+    cp2k_node.cp2k_shell = fake_cp2k_shell
+    cp2k_node.run()
+
+    for atom, result in zip(atoms, cp2k_node.outputs):
+        assert result.get_potential_energy() == pytest.approx(np.sum(atom.positions**2))
+        npt.assert_allclose(result.get_forces(), -2 * atom.positions)
+    # restarts after the crash and for the new periodicity, reloads for Si7
+    assert pathlib.Path("shell.log").read_text().split() == [
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "EVAL_EF",
+        "EVAL_EF",
+        "EVAL_EF",
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "LOAD",
+        "EVAL_EF",
+    ]
+    assert (cp2k_node.cp2k_output_dir / "cp2k.out").exists()
+
+
+def test_CP2KNode_n_workers(atoms_si8, tmp_path, fake_cp2k_shell, monkeypatch):
+    os.chdir(tmp_path)
+    input_file = pathlib.Path("cp2k.yaml")
+    input_file.write_text(yaml.safe_dump({"force_eval": {"method": "quickstep"}}))
+    monkeypatch.setenv("FAKE_CP2K_SHELL_LOG", "shell.log")
+
+    atoms = [atoms_si8.copy() for _ in range(9)]
+    for seed, atom in enumerate(atoms):
+        atom.rattle(seed=seed)
+
+    cp2k_node = znlib.atomistic.CP2KNode(input_file=input_file, atoms=atoms)
+    cp2k_node.cp2k_shell = f"env WORKER={{worker}} {fake_cp2k_shell}"
+    cp2k_node.n_workers = 3
+    cp2k_node.run()
+
+    assert len(cp2k_node.outputs) == 9
+    for atom, result in zip(atoms, cp2k_node.outputs):
+        npt.assert_allclose(result.positions, atom.positions)
+        assert result.get_potential_energy() == pytest.approx(np.sum(atom.positions**2))
+    assert pathlib.Path("shell.log").read_text().split().count("start") == 3
+    for idx in range(3):
+        assert (cp2k_node.cp2k_output_dir / f"worker_{idx}" / "cp2k.out").exists()
+
+
+def test_CP2KNode_resume(atoms_si8, tmp_path, fake_cp2k_shell, monkeypatch):
+    os.chdir(tmp_path)
+    input_file = pathlib.Path("cp2k.yaml")
+    input_file.write_text(yaml.safe_dump({"force_eval": {"method": "quickstep"}}))
+    monkeypatch.setenv("FAKE_CP2K_SHELL_LOG", "shell.log")
+    pathlib.Path("crash").write_text("6")
+    monkeypatch.setenv("FAKE_CP2K_SHELL_CRASH", "crash")
+
+    atoms = [atoms_si8.copy() for _ in range(10)]
+    for seed, atom in enumerate(atoms):
+        atom.rattle(seed=seed)
+
+    outputs = pathlib.Path("nodes", "CP2KNode", "outputs.db")
+    basis_set = pathlib.Path("BASIS_SET")
+    basis_set.write_text("Si DZVP")
+
+    def run_node() -> int:
+        """Run the node and return the number of evaluated frames"""
+        pathlib.Path("shell.log").write_text("")
+        cp2k_node = znlib.atomistic.CP2KNode(
+            input_file=input_file, atoms=atoms, dependencies=[basis_set.name]
+        )
+        cp2k_node.cp2k_shell = fake_cp2k_shell
+        cp2k_node.max_restarts = 0
+        with contextlib.suppress(AssertionError):
+            cp2k_node.run()
+        return pathlib.Path("shell.log").read_text().split().count("EVAL_EF")
+
+    # the first run is interrupted at the seventh frame
+    assert run_node() == 7
+    assert len(ase.db.connect(outputs)) == 6
+    assert run_node() == 4
+    assert len(ase.db.connect(outputs)) == 10
+    for atom, result in zip(atoms, znlib.atomistic.ase.LazyAtomsSequence(outputs)):
+        npt.assert_allclose(result.positions, atom.positions)
+        assert result.get_potential_energy() == pytest.approx(np.sum(atom.positions**2))
+
+    # only the frames from the first changed frame are computed again
+    atoms[7].rattle(seed=42)
+    assert run_node() == 3
+    assert run_node() == 0
+    assert len(ase.db.connect(outputs)) == 10
+    npt.assert_allclose(
+        znlib.atomistic.ase.LazyAtomsSequence(outputs)[7].positions, atoms[7].positions
+    )
+
+    # a different dependency or input computes all frames again
+    basis_set.write_text("Si TZVP")
+    assert run_node() == 10
+    input_file.write_text(yaml.safe_dump({"force_eval": {"method": "fist"}}))
+    assert run_node() == 10
+
+
+def test_CP2KNode_cache(atoms_si8, tmp_path, fake_cp2k_shell, monkeypatch):
+    os.chdir(tmp_path)
+    input_file = pathlib.Path("cp2k.yaml")
+    input_file.write_text(yaml.safe_dump({"force_eval": {"method": "quickstep"}}))
+    monkeypatch.setenv("FAKE_CP2K_SHELL_LOG", "shell.log")
+
+    atoms = [atoms_si8.copy() for _ in range(5)]
+    for seed, atom in enumerate(atoms):
+        atom.rattle(seed=seed)
+
+    basis_set = pathlib.Path("BASIS_SET")
+    basis_set.write_text("Si DZVP")
+
+    def run_node(name: str, frames: list, stress_tensor: bool = True):
+        """Run the node and return the number of evaluated frames"""
+        pathlib.Path("shell.log").write_text("")
+        cp2k_node = znlib.atomistic.CP2KNode(
+            input_file=input_file,
+            atoms=frames,
+            name=name,
+            dependencies=[basis_set.name],
+        )
+        cp2k_node.cp2k_shell = fake_cp2k_shell
+        cp2k_node.cache_dir = "cache"
+        cp2k_node.stress_tensor = stress_tensor
+        cp2k_node.run()
+        evaluations = pathlib.Path("shell.log").read_text().split().count("EVAL_EF")
+        return cp2k_node, evaluations
+
+    first, _ = run_node("first", atoms)
+    energies = [x.get_potential_energy() for x in first.outputs]
+    cp2k_node, evaluations = run_node("second", atoms + atoms[:2])
+    assert evaluations == 0
+    assert [x.get_potential_energy() for x in cp2k_node.outputs] == (
+        energies + energies[:2]
+    )
+    assert cp2k_node.cache_info["hits"] == 7
+    assert cp2k_node.cache_info["misses"] == 0
+    assert cp2k_node.cache_info["entries"] == 5
+    assert cp2k_node.telemetry["cached"].all()
+
+    # the final input and the contents of the dependencies are part of the key
+    assert run_node("third", atoms[:2], stress_tensor=False)[1] == 2
+    basis_set.write_text("Si TZVP")
+    assert run_node("fourth", atoms[:2])[1] == 2
+
+    # the least recently used results are evicted
+    with znlib.atomistic.cp2k.CP2KCache("cache", max_bytes=0) as cache:
+        key = cache.get_key(atoms[0], "script")
+        cache.put(key, {"energy": 1.0, "forces": np.zeros((8, 3))})
+        assert cache.get(key) is None
+        assert cache.info()["evictions"] == 10
+        assert cache.info()["entries"] == 0
+
+
+def test_CP2KNode_wfn_chaining(
+    cp2k_si8_input, atoms_si8, tmp_path, fake_cp2k_shell, monkeypatch
+):
+    os.chdir(tmp_path)
+    input_file = pathlib.Path("cp2k.yaml")
+    input_file.write_text(yaml.safe_dump(cp2k_si8_input))
+    monkeypatch.setenv("FAKE_CP2K_SHELL_LOG", "shell.log")
+    # the SCF from the restart file of the third frame "fails"
+    pathlib.Path("crash").write_text("2")
+    monkeypatch.setenv("FAKE_CP2K_SHELL_CRASH", "crash")
+
+    atoms = [atoms_si8.copy() for _ in range(5)]
+    for seed, atom in enumerate(atoms):
+        atom.rattle(seed=seed)
+    atoms[2].pbc = atoms[3].pbc = atoms[4].pbc = True
+    del atoms[3][0]
+    del atoms[4][0]
+
+    cp2k_node = znlib.atomistic.CP2KNode(
+        input_file=input_file, atoms=atoms, wfn_chaining=True
+    )
+    cp2k_node.cp2k_shell = fake_cp2k_shell
+    cp2k_node.run()
+
+    assert "SCF_GUESS RESTART" in (cp2k_node.cp2k_output_dir / "cp2k.inp").read_text()
+    # a new session for the periodicity reads the restart file, which is removed
+    # for the retry and for the new composition
+    assert pathlib.Path("shell.log").read_text().split() == [
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "EVAL_EF",
+        "start",
+        "LOAD",
+        "RESTART_WFN",
+        "EVAL_EF",
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "LOAD",
+        "EVAL_EF",
+        "EVAL_EF",
+    ]
+    assert len(cp2k_node.outputs) == 5
+    # the SCF needs fewer steps from the previous wavefunction
+    assert cp2k_node.telemetry["scf_iterations"].tolist() == [10, 5, 10, 10, 5]
+    assert cp2k_node.telemetry["scf_converged"].all()
+    assert (cp2k_node.telemetry["wall_time"] > 0).all()
+    assert (cp2k_node.telemetry["peak_rss_mb"] > 0).all()
+
+
+def test_CP2KNode_wfn_chaining_not_converged(
+    cp2k_si8_input, atoms_si8, tmp_path, fake_cp2k_shell, monkeypatch
+):
+    os.chdir(tmp_path)
+    input_file = pathlib.Path("cp2k.yaml")
+    input_file.write_text(yaml.safe_dump(cp2k_si8_input))
+    monkeypatch.setenv("FAKE_CP2K_SHELL_LOG", "shell.log")
+    # the SCF of the first frame does not converge from the atomic guess, which is
+    # not repeated, and of the second frame from the first wavefunction
+    pathlib.Path("not_converged").write_text("0 1")
+    monkeypatch.setenv("FAKE_CP2K_SHELL_NOT_CONVERGED", "not_converged")
+
+    atoms = [atoms_si8.copy() for _ in range(4)]
+    for seed, atom in enumerate(atoms):
+        atom.rattle(seed=seed)
+
+    cp2k_node = znlib.atomistic.CP2KNode(
+        input_file=input_file, atoms=atoms, wfn_chaining=True
+    )
+    cp2k_node.cp2k_shell = fake_cp2k_shell
+    cp2k_node.run()
+
+    # the frame is computed again in a new session without the restart file
+    assert pathlib.Path("shell.log").read_text().split() == [
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "EVAL_EF",
+        "start",
+        "LOAD",
+        "EVAL_EF",
+        "EVAL_EF",
+        "EVAL_EF",
+    ]
+    assert len(cp2k_node.outputs) == 4
+    npt.assert_array_equal(cp2k_node.telemetry["scf_iterations"], [np.nan, 10, 5, 5])
+    assert cp2k_node.telemetry["scf_converged"].tolist() == [False, True, True, True]
+
+
+def test_reset_peak_rss():
+    # allocate and free 200 MB, then wait for the input
+    script = "x = bytearray(200 * 2**20); del x; print(flush=True); input()"
+    with subprocess.Popen(
+        [sys.executable, "-c", script], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    ) as process:
+        process.stdout.readline()
+        assert znlib.atomistic.cp2k.get_peak_rss(process.pid) > 200
+        if znlib.atomistic.cp2k.reset_peak_rss(process.pid):
+            assert znlib.atomistic.cp2k.get_peak_rss(process.pid) < 100
+        process.communicate(b"\n")
+
+
+def test_parse_scf_convergence():
+    output = "  *** SCF run converged in     12 steps ***\n"
+    assert znlib.atomistic.cp2k.parse_scf_convergence(output) == (12, True)
+    output += "\n  *** SCF run NOT converged ***\n"
+    iterations, converged = znlib.atomistic.cp2k.parse_scf_convergence(output)
+    assert np.isnan(iterations) and converged is False
+    assert znlib.atomistic.cp2k.parse_scf_convergence("")[1] is None
+
+
+def test_iter_bounded():
+    taken = []
+
+    def items():
+        for item in range(10):
+            taken.append(item)
+            yield item
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        results = znlib.atomistic.ase.iter_bounded(executor, lambda x: x**2, items(), 3)
+        assert next(results) == 0
+        assert taken == [0, 1, 2, 3]
+        results.close()
+        assert len(taken) == 4
+        results = znlib.atomistic.ase.iter_bounded(
+            executor, lambda x: x**2, range(5), 2
+        )
+        assert list(results) == [0, 1, 4, 9, 16]
+
+
+def test_get_contiguous_ranges():
+    assert znlib.atomistic.ase.get_contiguous_ranges([]) == []
+    assert znlib.atomistic.ase.get_contiguous_ranges([0, 1, 2, 5, 6, 9]) == [
+        (0, 3),
+        (5, 7),
+        (9, 10),
+    ]
+
+
+def test_LazyAtomsSequence_ranges(tetraeder_test_db, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(tetraeder_test_db)
+    assert sequence[[7, 2, 3, 4, 15]] == [atoms[x] for x in [7, 2, 3, 4, 15]]
+    assert sequence[5:12:3] == atoms[5:12:3]
+    assert list(sequence) == atoms
+
+
+def test_LazyAtomsSequence_cache(tetraeder_test_db, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(tetraeder_test_db, maxsize=5)
+    assert list(sequence) == atoms
+    info = sequence.cache_info()
+    assert info.currsize == 5
+    assert info.misses == 20
+    assert info.evictions == 15
+
+    assert sequence[19] == atoms[19]
+    assert sequence.cache_info().hits == 1
+    assert sequence[0] == atoms[0]
+    assert list(sequence.__dict__["atoms"]) == [16, 17, 18, 19, 0]
+
+    sequence.set_cache_policy(maxbytes=0)
+    assert sequence.cache_info().currsize == 0
+    sequence.set_cache_policy(maxsize=None, maxbytes=None)
+    assert sequence.tolist() == atoms
+    assert sequence.cache_info().currsize == 20
+
+
+def test_LazyAtomsSequence_iter_prefetch(tetraeder_test_db, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(tetraeder_test_db, maxsize=0)
+    assert list(sequence.iter_prefetch(chunk_size=3, prefetch=2)) == atoms
+    assert sequence.cache_info().misses == 20
+
+    iterator = sequence.iter_prefetch(chunk_size=4)
+    assert next(iterator) == atoms[0]
+    iterator.close()
+
+
+def test_LazyAtomsSequence_connection(tetraeder_test_db, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+
+    with znlib.atomistic.ase.LazyAtomsSequence(tetraeder_test_db) as sequence:
+        assert sequence[3] == atoms[3]
+        connection = sequence._connection
+        assert sequence[4] == atoms[4]
+        assert len(sequence) == 20
+        assert sequence._connection is connection
+    assert sequence._connection is None
+
+    sequence = pickle.loads(pickle.dumps(sequence))
+    assert sequence[5] == atoms[5]
+    sequence.close()
+
+
+def test_LazyAtomsSequence_view(tetraeder_test_db, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(tetraeder_test_db, maxsize=10)
+    size = len(pickle.dumps(sequence))
+    assert list(sequence) == atoms
+    assert len(pickle.dumps(sequence)) == size
+
+    view = sequence.view(2, 17, 3)
+    assert len(view) == 5
+    assert view.cache_info().currsize == 0
+    assert view.cache_info().maxsize == 10
+    assert list(view) == atoms[2:17:3]
+    assert view[-1] == atoms[14]
+    assert view[[3, 1]] == [atoms[11], atoms[5]]
+    assert view.view(None, None, -2)[:] == atoms[14:1:-6]
+    npt.assert_array_equal(
+        view.get_array("positions"), np.array([x.positions for x in atoms[2:17:3]])
+    )
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        views = [sequence.view(start, None, 4) for start in range(4)]
+        assert list(executor.map(len, views)) == [5, 5, 5, 5]
+        assert list(executor.map(list, views))[1] == atoms[1::4]
+
+
+def test_LazyAtomsSequence_select(tmp_path, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    atoms.append(ase.Atoms("H2O", positions=np.random.random((3, 3))))
+    for idx, atom in enumerate(atoms):
+        atom.calc = SinglePointCalculator(atom, energy=float(idx))
+    file = tmp_path / "atoms.db"
+    znlib.atomistic.ase.write_atoms_to_db(file, atoms, group="test")
+
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(file.as_posix())
+    assert sequence.select("energy<3")[:] == atoms[:3]
+    assert sequence.select("O")[:] == atoms[20:]
+    assert len(sequence.select("natoms=5", group="test")) == 20
+    assert len(sequence.select(group="other")) == 0
+
+    selection = sequence.view(None, None, -2).select("energy>14.5")
+    assert selection[:] == [atoms[20], atoms[18], atoms[16]]
+    assert pickle.loads(pickle.dumps(selection)).get_info("energy").tolist() == [
+        20.0,
+        18.0,
+        16.0,
+    ]
+    assert selection.cache_info().currsize == 3
+    assert sequence.cache_info().currsize == 0
+
+
+def test_LazyAtomsSequence_get_array(tmp_path):
+    atoms = [ase.Atoms("H" * n, positions=np.random.random((n, 3))) for n in [2, 4, 3]]
+    for idx, atom in enumerate(atoms):
+        atom.calc = SinglePointCalculator(
+            atom, energy=float(idx), forces=np.random.random((len(atom), 3))
+        )
+    # only the first frame has a stress
+    atoms[0].calc.results["stress"] = np.arange(6.0)
+    database = tmp_path / "atoms.db"
+    with ase.db.connect(database) as db:
+        for atom in atoms:
+            db.write(atom, group="test")
+
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(database.as_posix())
+    forces = sequence.get_array("forces")
+    assert forces.shape == (3, 4, 3)
+    npt.assert_array_equal(forces[0, :2], atoms[0].get_forces())
+    assert np.isnan(forces[0, 2:]).all()
+
+    values, offsets = sequence.get_array("positions", [2, 1], ragged=True)
+    npt.assert_array_equal(offsets, [0, 3, 7])
+    npt.assert_array_equal(values[3:7], atoms[1].get_positions())
+
+    npt.assert_array_equal(sequence.get_array("numbers", ragged=True)[0], [1] * 9)
+    assert sequence.get_array("cell", slice(1, None)).shape == (2, 3, 3)
+    assert sequence.get_array("cell", []).shape == (0, 3, 3)
+    npt.assert_array_equal(sequence.get_info("energy", [-1, 0]), [2.0, 0.0])
+    with pytest.raises(IndexError):
+        sequence.get_info("energy", [3])
+    stress = sequence.get_array("stress")
+    npt.assert_array_equal(stress[0], np.arange(6.0))
+    assert stress.shape == (3, 6) and np.isnan(stress[1:]).all()
+    npt.assert_array_equal(sequence.get_info("energy"), [0.0, 1.0, 2.0])
+    assert sequence.get_info("group", [0]).tolist() == ["test"]
+    assert sequence.cache_info().currsize == 0
+
+
+def test_write_atoms_to_db(tmp_path, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    for idx, atom in enumerate(atoms):
+        atom.calc = SinglePointCalculator(
+            atom, energy=float(idx), forces=np.random.random((len(atom), 3))
+        )
+    atoms[0].set_constraint(ase.constraints.FixAtoms([0]))
+
+    with ase.db.connect(tmp_path / "reference.db") as db:
+        for atom in atoms:
+            db.write(atom, group="test", value=1)
+
+    file = tmp_path / "bulk.db"
+    assert (
+        znlib.atomistic.ase.write_atoms_to_db(
+            file, atoms[:15], commit_interval=4, group="test", value=1
+        )
+        == 15
+    )
+    znlib.atomistic.ase.write_atoms_to_db(
+        file, atoms[15:], append=True, group="test", value=1
+    )
+
+    reference = ase.db.connect(tmp_path / "reference.db")
+    database = ase.db.connect(file)
+    assert len(database) == len(atoms)
+    assert database.count(group="test") == len(atoms)
+    assert database.count("C=1,energy>9.5") == 10
+    for row, reference_row in zip(database.select(), reference.select()):
+        assert row.toatoms() == reference_row.toatoms()
+        assert row.key_value_pairs == reference_row.key_value_pairs
+        assert row.energy == reference_row.energy
+        npt.assert_array_equal(row.forces, reference_row.forces)
+        assert [x.todict() for x in row.constraints] == [
+            x.todict() for x in reference_row.constraints
+        ]
+        assert row.calculator == reference_row.calculator
+
+    statement = "SELECT name FROM sqlite_master WHERE type='index' ORDER BY name"
+    with sqlite3.connect(file) as con, sqlite3.connect(tmp_path / "reference.db") as ref:
+        indices = con.execute(statement).fetchall()
+        assert set(ref.execute(statement).fetchall()) < set(indices)
+        assert ("energy_index",) in indices
+
+
+@pytest.mark.parametrize("background", [True, False])
+def test_AtomsWriter(tmp_path, tetraeder_test_traj, background):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    file = tmp_path / "stream.db"
+
+    with znlib.atomistic.ase.AtomsWriter(
+        file, commit_interval=3, background=background, group="test"
+    ) as writer:
+        writer.extend(atom for atom in atoms[:10])
+        assert len(writer) == 10
+        assert writer[4] == atoms[4]
+        assert writer[::3] == atoms[:10:3]
+        for atom in atoms[10:]:
+            writer.append(atom)
+            atom.positions += 1.0  # rows are encoded on append
+
+    assert list(writer) == ase.io.read(tetraeder_test_traj, index=":")
+    with pytest.raises(ValueError):
+        writer.append(atoms[0])
+
+    database = ase.db.connect(file)
+    assert database.count(group="test") == len(atoms)
+    statement = "SELECT name FROM sqlite_master WHERE type='index'"
+    with sqlite3.connect(file) as con:
+        indices = con.execute(statement).fetchall()
+    assert len(indices) > 0
+
+    # appending a small batch keeps the indices instead of rebuilding them
+    with znlib.atomistic.ase.AtomsWriter(
+        file, commit_interval=1, append=True, background=background
+    ) as writer:
+        writer.append(atoms[0])
+        writer.flush()
+        with sqlite3.connect(file) as con:
+            assert con.execute(statement).fetchall() == indices
+    assert len(database) == len(atoms) + 1
+
+
+def test_ColumnarAtomsSequence(tmp_path, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    atoms.append(ase.Atoms("H2", positions=[(0, 0, 0), (0, 0, 0.7)]))
+    for idx, atom in enumerate(atoms[:10]):
+        atom.calc = SinglePointCalculator(
+            atom, energy=float(idx), forces=np.random.random((len(atom), 3))
+        )
+
+    directory = tmp_path / "atoms"
+    frames = (atom for atom in atoms)
+    assert znlib.atomistic.ase.write_atoms_to_npy(directory, frames) == 21
+    assert not (directory / "stress.npy").exists()
+    assert sorted(x.name for x in directory.iterdir()) == [
+        "cell.npy",
+        "energy.npy",
+        "forces.npy",
+        "numbers.npy",
+        "offsets.npy",
+        "pbc.npy",
+        "positions.npy",
+    ]
+
+    sequence = znlib.atomistic.ase.ColumnarAtomsSequence(directory.as_posix())
+    assert len(sequence) == 21
+    assert sequence.tolist() == atoms
+    assert isinstance(sequence[3].arrays["positions"], np.memmap)
+    assert sequence[3].get_potential_energy() == 3.0
+    npt.assert_array_equal(sequence[3].get_forces(), atoms[3].get_forces())
+    assert sequence[15].calc is None
+
+    forces = sequence.get_array("forces", [3, 20])
+    assert forces.shape == (2, 5, 3)
+    npt.assert_array_equal(forces[0], atoms[3].get_forces())
+    assert np.isnan(forces[1]).all()
+    values, offsets = sequence.get_array("positions", ragged=True)
+    assert isinstance(values, np.memmap)
+    assert offsets[-1] == 102
+    assert sequence.get_array("cell", slice(0, 2)).shape == (2, 3, 3)
+    npt.assert_array_equal(sequence.get_info("natoms", [0, 20]), [5, 2])
+    assert sequence.get_info("energy")[3] == 3.0
+    with pytest.raises(KeyError):
+        sequence.get_info("group")
+
+    assert sequence.select("energy<3")[:] == atoms[:3]
+    assert sequence.select("H=2")[:] == atoms[20:]
+    assert len(sequence.select("C,natoms=5")) == 20
+    assert sequence.view(None, None, -2).select("energy>5")[:] == [atoms[8], atoms[6]]
+    with pytest.raises(KeyError):
+        sequence.select(group="test")
+
+    sequence = pickle.loads(pickle.dumps(sequence))
+    assert sequence[20] == atoms[20]
+
+    view = sequence.view(19, None)
+    assert view[:] == atoms[19:]
+    npt.assert_array_equal(view.get_info("natoms"), [5, 2])
+    assert view.get_array("positions", ragged=True)[1].tolist() == [0, 5, 7]
+
+
+class FileToNpy(znlib.atomistic.FileToASE):
+    atoms = znlib.atomistic.ase.ZnAtoms(backend="npy")
+
+
+def test_ZnAtoms_npy(proj_path, tetraeder_test_traj):
+    data = FileToNpy(file=tetraeder_test_traj)
+    data.run_and_save()
+
+    loaded_data = FileToNpy.load()
+    assert isinstance(loaded_data.atoms, znlib.atomistic.ase.ColumnarAtomsSequence)
+    assert loaded_data.atoms.tolist() == ase.io.read(tetraeder_test_traj, index=":")
+
+
+def test_iread_parallel(tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+
+    offsets = znlib.atomistic.ase.get_xyz_frame_offsets(tetraeder_test_traj)
+    assert len(offsets) == 21
+    assert offsets[-1] == pathlib.Path(tetraeder_test_traj).stat().st_size
+
+    frames = znlib.atomistic.ase.iread_parallel(
+        tetraeder_test_traj, n_workers=2, frames_per_chunk=3
+    )
+    assert list(frames) == atoms
+    frames = znlib.atomistic.ase.iread_parallel(tetraeder_test_traj, 2, max_frames=7)
+    assert list(frames) == atoms[:7]
+
+
+def test_FileToASE_n_workers(proj_path, tetraeder_test_traj):
+    traj_file = pathlib.Path(tetraeder_test_traj)
+    shutil.copy(traj_file, ".")
+
+    data = znlib.atomistic.FileToASE(file=traj_file.name, frames_to_read=12, n_workers=2)
+    data.write_graph(run=True)
+
+    loaded_data = znlib.atomistic.FileToASE.load()
+    assert loaded_data.n_workers == 2
+    assert loaded_data.atoms.tolist() == ase.io.read(tetraeder_test_traj, index=":12")
+
+
+def test_TrajectorySequence(tmp_path, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    file = tmp_path / "trajectory.extxyz"
+    shutil.copy(tetraeder_test_traj, file)
+
+    offsets = znlib.atomistic.ase.get_frame_offsets_index(file)
+    index_file = tmp_path / "trajectory.extxyz.offsets.npz"
+    assert offsets.tolist() == znlib.atomistic.ase.get_xyz_frame_offsets(file)
+    assert index_file.exists()
+
+    os.utime(file, ns=(0, 0))
+    mtime = index_file.stat().st_mtime_ns
+    npt.assert_array_equal(znlib.atomistic.ase.get_frame_offsets_index(file), offsets)
+    assert index_file.stat().st_mtime_ns > mtime  # hash matched, mtime updated
+
+    sequence = znlib.atomistic.ase.TrajectorySequence(file.as_posix())
+    assert len(sequence) == 20
+    assert sequence[7] == atoms[7]
+    assert sequence.view(3, None, 5)[:] == atoms[3::5]
+    assert pickle.loads(pickle.dumps(sequence)).tolist() == atoms
+    npt.assert_array_equal(
+        sequence.get_array("positions", [-1, 0]),
+        [atoms[-1].positions, atoms[0].positions],
+    )
+    assert np.isnan(sequence.get_array("forces")).all()
+    assert sequence.get_array("cell").shape == (20, 3, 3)
+
+    # the arrays are the same as from a database with the same frames
+    for idx, atom in enumerate(atoms[:3]):
+        atom.calc = SinglePointCalculator(
+            atom, forces=np.random.random((5, 3)), stress=np.arange(6.0) + idx
+        )
+    ase.io.write(tmp_path / "results.extxyz", atoms[:3])
+    znlib.atomistic.ase.write_atoms_to_db(tmp_path / "results.db", atoms[:3])
+    trajectory = znlib.atomistic.ase.TrajectorySequence(
+        (tmp_path / "results.extxyz").as_posix()
+    )
+    database = znlib.atomistic.ase.LazyAtomsSequence((tmp_path / "results.db").as_posix())
+    # extxyz stores 8 decimals
+    for name in ["forces", "stress", "pbc", "numbers"]:
+        npt.assert_allclose(
+            trajectory.get_array(name), database.get_array(name), atol=1e-7
+        )
+    for reference, value in zip(
+        database.get_array("forces", ragged=True),
+        trajectory.get_array("forces", ragged=True),
+    ):
+        npt.assert_allclose(value, reference, atol=1e-7)
+
+    npt.assert_array_equal(sequence.get_info("natoms", [2, 0]), [5, 5])
+    assert np.isnan(sequence.get_info("energy", [0])).all()
+    assert sequence.view(None, None, -7).select("C,natoms=5")[:] == atoms[::-7]
+    assert len(sequence.select("H=2")) == 0
+    sequence.close()
+
+    ase.io.write(file, atoms[:4])
+    assert len(znlib.atomistic.ase.TrajectorySequence(file.as_posix())) == 4
+
+
+def test_FileToASE_selection(tmp_path, tetraeder_test_traj, caplog):
+    os.chdir(tmp_path)
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    lines = pathlib.Path(tetraeder_test_traj).read_text().splitlines(keepends=True)
+    lines[9] = "this frame can not be parsed\n"  # the first atom of the second frame
+    pathlib.Path("broken.extxyz").write_text("".join(lines))
+    ase.io.write("atoms.traj", atoms)
+
+    for file in ["broken.extxyz", "atoms.traj"]:
+        data = znlib.atomistic.FileToASE(file=file, start=2, stop=15, step=3)
+        data.run()
+        assert list(data.atoms) == atoms[2:15:3]
+
+        data = znlib.atomistic.FileToASE(file=file, step=-2, frames_to_read=3)
+        data.run()
+        assert list(data.atoms) == atoms[::-2][:3]
+
+        caplog.clear()
+        data = znlib.atomistic.FileToASE(file=file, start=2, n_samples=5, seed=1)
+        data.run()
+        samples = list(data.atoms)
+        assert "parsing the whole file" not in caplog.text
+        indices = data.get_frame_indices(20)
+        assert len(samples) == 5
+        assert samples == [atoms[x] for x in indices]
+        assert indices == sorted(indices)
+        assert 1 not in indices
+
+    assert data.get_frame_indices(20) == indices
+    data.seed = 2
+    assert data.get_frame_indices(20) != indices
+
+
+def test_FileToASE_no_trailing_newline(tmp_path, tetraeder_test_traj):
+    os.chdir(tmp_path)
+    atoms = ase.io.read(tetraeder_test_traj, index=":3")
+    ase.io.write("atoms.extxyz", atoms)
+    text = pathlib.Path("atoms.extxyz").read_text()
+    pathlib.Path("atoms.extxyz").write_text(text.rstrip("\n"))
+    assert len(ase.io.read("atoms.extxyz", index=":")) == 3
+
+    assert len(znlib.atomistic.ase.get_xyz_frame_offsets("atoms.extxyz")) == 4
+    offsets = znlib.atomistic.ase.get_xyz_frame_offsets(
+        "atoms.extxyz", complete_lines=True
+    )
+    assert len(offsets) == 3
+    data = znlib.atomistic.FileToASE(file="atoms.extxyz")
+    data.run()
+    assert list(data.atoms) == atoms
+    assert znlib.atomistic.ase.TrajectorySequence("atoms.extxyz").tolist() == atoms
+
+
+def test_IncrementalFileToASE(proj_path, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    ase.io.write("trajectory.extxyz", atoms[:8])
+
+    data = znlib.atomistic.IncrementalFileToASE(file="trajectory.extxyz", step=2)
+    data.write_graph(run=True)
+    database = "nodes/IncrementalFileToASE/atoms.db"
+    assert ase.db.connect(database).metadata["ingested"]["frames"] == 8
+    ctime = ase.db.connect(database).get(id=1).ctime
+
+    ase.io.write("trajectory.extxyz", atoms[8:15], append=True)
+    with open("trajectory.extxyz", "a") as file:
+        file.write("5\nan incomplete frame\n")
+    subprocess.check_call(["dvc", "repro"])
+
+    loaded_data = znlib.atomistic.IncrementalFileToASE.load()
+    assert loaded_data.atoms.tolist() == atoms[:15:2]
+    assert ase.db.connect(database).metadata["ingested"]["frames"] == 15
+    assert ase.db.connect(database).get(id=1).ctime == ctime
+
+    ase.io.write("trajectory.extxyz", atoms[10:])
+    subprocess.check_call(["dvc", "repro"])
+    assert znlib.atomistic.IncrementalFileToASE.load().atoms.tolist() == atoms[10::2]
+    assert ase.db.connect(database).get(id=1).ctime > ctime
+
+
+@pytest.mark.parametrize("elements", [None, "H", 3, ["C", "H"], [0, 2, 4], [1, 6]])
+def test_get_rdf(tetraeder_test_traj, elements):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    bulk = ase.build.bulk("Cu", "fcc", a=3.6, cubic=True).repeat(4)
+    bulk.rattle(0.2, seed=42)
+    bulk.pbc = [True, True, False]
+    bulk.numbers[::3] = 1
+    bulk.numbers[::5] = 6
+    atoms.append(bulk)
+
+    analysis = ase.geometry.analysis.Analysis(atoms)
+    for image, reference in zip(atoms, analysis.get_rdf(1.9, 17, elements=elements)):
+        npt.assert_array_equal(
+            znlib.atomistic.ase.get_rdf(image, 1.9, 17, elements=elements), reference
+        )
+
+
+def test_RadialDistributionFunction_engine(tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    plots = []
+    for engine, n_workers in [("ase", None), ("numpy", None), ("numpy", 2)]:
+        rdf = znlib.atomistic.ase.RadialDistributionFunction(
+            data=atoms,
+            rmax=1.9,
+            nbins=10,
+            elements=["C", "H"],
+            engine=engine,
+            n_workers=n_workers,
+        )
+        rdf.run()
+        plots.append(rdf.plot)
+    pd.testing.assert_frame_equal(plots[0], plots[1])
+    pd.testing.assert_frame_equal(plots[0], plots[2])
+
+
+def test_sum_rdf_parallel(tetraeder_test_db, tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    sequence = znlib.atomistic.ase.LazyAtomsSequence(tetraeder_test_db)
+
+    total, n_frames = znlib.atomistic.ase.sum_rdf_parallel(
+        sequence, rmax=1.9, nbins=10, n_workers=2, chunk_size=3
+    )
+    reference = znlib.atomistic.ase.sum_rdf(atoms, rmax=1.9, nbins=10)
+    assert n_frames == reference[1] == 20
+    npt.assert_allclose(total, reference[0])
+    assert sequence.cache_info().currsize == 0
+
+
+def test_RadialDistributionFunction_all_pairs(tetraeder_test_traj):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    plots = []
+    for n_workers in [None, 2]:
+        rdf = znlib.atomistic.ase.RadialDistributionFunction(
+            data=atoms,
+            rmax=1.9,
+            nbins=10,
+            all_pairs=True,
+            engine="numpy",
+            n_workers=n_workers,
+        )
+        rdf.run()
+        plots.append(rdf.plot)
+    pd.testing.assert_frame_equal(plots[0], plots[1], check_like=True)
+    assert set(plots[0].columns) == {"x", "y", "H-H", "H-C", "C-C"}
+
+    analysis = ase.geometry.analysis.Analysis(atoms)
+    npt.assert_allclose(plots[0]["y"], np.mean(analysis.get_rdf(1.9, 10), axis=0))
+    npt.assert_allclose(
+        plots[0]["H-C"], np.mean(analysis.get_rdf(1.9, 10, elements=[1, 6]), axis=0)
+    )
+    for image in atoms[:3]:
+        rdfs = znlib.atomistic.ase.get_partial_rdfs(image, 1.9, 10)
+        npt.assert_array_equal(rdfs[None], znlib.atomistic.ase.get_rdf(image, 1.9, 10))
+        for pair in [(1, 1), (1, 6), (6, 6)]:
+            npt.assert_array_equal(
+                rdfs[pair], znlib.atomistic.ase.get_rdf(image, 1.9, 10, elements=pair)
+            )
+
+    with pytest.raises(ValueError):
+        znlib.atomistic.ase.RadialDistributionFunction(
+            data=atoms, rmax=1.9, nbins=10, all_pairs=True
+        ).run()
+
+
+@pytest.mark.parametrize("n_workers", [None, 2])
+def test_RadialDistributionFunction_tolerance(tetraeder_test_traj, n_workers):
+    atoms = ase.io.read(tetraeder_test_traj, index=":")
+    rdf = znlib.atomistic.ase.RadialDistributionFunction(
+        data=atoms, rmax=1.9, nbins=10, engine="numpy", block_size=4, n_workers=n_workers
+    )
+    rdf.run()
+    rdfs = np.array([znlib.atomistic.ase.get_rdf(x, 1.9, 10) for x in atoms])
+    block_means = rdfs.reshape((5, 4, 10)).mean(axis=1)
+    npt.assert_allclose(rdf.plot["y"], rdfs.mean(axis=0))
+    npt.assert_allclose(
+        rdf.stderr["y"], block_means.std(axis=0, ddof=1) / np.sqrt(5), atol=1e-12
+    )
+
+    # a large tolerance stops after 'min_blocks' blocks
+    rdf = znlib.atomistic.ase.RadialDistributionFunction(
+        data=atoms,
+        rmax=1.9,
+        nbins=10,
+        engine="numpy",
+        block_size=2,
+        tolerance=1e3,
+        n_workers=n_workers,
+    )
+    rdf.run()
+    npt.assert_allclose(rdf.plot["y"], rdfs[:10].mean(axis=0))
+
+    rdf.engine = "ase"
+    with pytest.raises(ValueError):
+        rdf.run()
+
+
+def test_MeanSquaredDisplacement():
+    rng = np.random.default_rng(42)
+    unwrapped = np.cumsum(rng.normal(scale=0.5, size=(40, 6, 3)), axis=0)
+    atoms = []
+    for positions in unwrapped:
+        atom = ase.Atoms("H4O2", positions=positions, cell=[3, 4, 5], pbc=True)
+        atom.wrap()
+        atoms.append(atom)
+
+    naive = np.array(
+        [
+            np.mean(np.sum((unwrapped[lag:] - unwrapped[: 40 - lag]) ** 2, axis=2))
+            for lag in range(40)
+        ]
+    )
+    msd = znlib.atomistic.ase.MeanSquaredDisplacement(data=atoms, timestep=0.5)
+    msd.atoms_per_chunk = 4
+    msd.run()
+    npt.assert_allclose(msd.plot["msd"], naive, atol=1e-8)
+    npt.assert_allclose(msd.plot["t"], np.arange(40) * 0.5)
+    assert msd.diffusion["diffusion_coefficient"] > 0
+
+    msd = znlib.atomistic.ase.MeanSquaredDisplacement(data=atoms, elements="O")
+    msd.run()
+    naive = [
+        np.mean(np.sum((unwrapped[lag:, 4:] - unwrapped[: 40 - lag, 4:]) ** 2, axis=2))
+        for lag in range(40)
+    ]
+    npt.assert_allclose(msd.plot["msd"], naive, atol=1e-8)
@@ -1,6 +1,6 @@
 """The znlib atomistic interface"""
 from znlib.atomistic import ase
-from znlib.atomistic.ase import FileToASE
+from znlib.atomistic.ase import FileToASE, IncrementalFileToASE
 from znlib.atomistic.cp2k import CP2KNode
 
-__all__ = ["ase", "FileToASE", "CP2KNode"]
+__all__ = ["ase", "FileToASE", "IncrementalFileToASE", "CP2KNode"]
@@ -1,30 +1,431 @@
 """Atomic Simulation Environment interface for znlib / ZnTrack """
 import collections.abc
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import json
 import logging
+import mmap
+import numbers
+import os
 import pathlib
+import pickle
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
 import typing
 
+import ase.calculators.calculator
+import ase.calculators.singlepoint
+import ase.data
 import ase.db
+import ase.db.core
+import ase.db.row
+import ase.db.sqlite
 import ase.geometry.analysis
+import ase.geometry.rdf
 import ase.io
+import ase.io.formats
+import ase.neighborlist
+import ase.stress
 import numpy as np
 import pandas as pd
 import tqdm
-from zntrack import Node, dvc, utils, zn
+from zntrack import Node, dvc, meta, utils, zn
 from zntrack.core import ZnTrackOption
 
 log = logging.getLogger(__name__)
 
 AtomsList = typing.List[ase.Atoms]
 
+# (dtype, shape per atom) of the per-atom arrays in the ase.db 'systems' table
+PER_ATOM_COLUMNS = {
+    "numbers": (np.int32, ()),
+    "positions": (float, (3,)),
+    "forces": (float, (3,)),
+    "momenta": (float, (3,)),
+    "masses": (float, ()),
+    "tags": (np.int32, ()),
+    "charges": (float, ()),
+    "magmoms": (float, ()),
+    "initial_charges": (float, ()),
+    "initial_magmoms": (float, ()),
+}
+# (dtype, shape per frame) of the per-frame arrays in the ase.db 'systems' table
+PER_FRAME_COLUMNS = {
+    "cell": (float, (3, 3)),
+    "pbc": (bool, (3,)),
+    # ASE stores the stress in Voigt form
+    "stress": (float, (6,)),
+    "dipole": (float, (3,)),
+}
+SCALAR_COLUMNS = [
+    "energy",
+    "free_energy",
+    "magmom",
+    "natoms",
+    "fmax",
+    "smax",
+    "volume",
+    "mass",
+    "charge",
+]
+# indices in addition to the ase.db defaults for 'LazyAtomsSequence.select'
+SELECT_INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS energy_index ON systems(energy)",
+    "CREATE INDEX IF NOT EXISTS natoms_index ON systems(natoms)",
+    "CREATE INDEX IF NOT EXISTS species_count_index ON species(Z, n)",
+    "CREATE INDEX IF NOT EXISTS text_value_index ON text_key_values(key, value)",
+    "CREATE INDEX IF NOT EXISTS number_value_index ON number_key_values(key, value)",
+]
+# file formats that 'iread_parallel' can split into frames
+XYZ_FORMATS = ["xyz", "extxyz"]
+# formats that can be counted and indexed without parsing every frame
+RANDOM_ACCESS_FORMATS = ["traj"]
+
+
+def iter_bounded(
+    executor: concurrent.futures.Executor,
+    fn: typing.Callable,
+    iterable: typing.Iterable,
+    ahead: int,
+) -> typing.Iterator:
+    """Yield 'fn(item)' for every item of 'iterable' in order, computed by 'executor'
+
+    At most 'ahead' items are submitted at once and the next item is only taken
+    from 'iterable' when a result is consumed, so neither the items nor the results
+    have to fit into memory. Pending items are cancelled when the iterator is
+    closed early.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+        A thread or process pool.
+    fn: callable
+        The function to apply, must be picklable for a process pool.
+    iterable: Iterable
+        The items, which are taken lazily in the calling thread.
+    ahead: int
+        Maximum number of submitted items, typically twice the number of workers.
+
+    Yields
+    ------
+    The results of 'fn' in the order of 'iterable'.
+    """
+    iterator = iter(iterable)
+    futures = collections.deque()
+
+    def submit_next():
+        for item in itertools.islice(iterator, 1):
+            futures.append(executor.submit(fn, item))
+
+    try:
+        for _ in range(max(ahead, 1)):
+            submit_next()
+        while len(futures) > 0:
+            result = futures.popleft().result()
+            submit_next()
+            yield result
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def get_contiguous_ranges(
+    indices: typing.List[int],
+) -> typing.List[typing.Tuple[int, int]]:
+    """Merge sorted, unique indices into contiguous half-open ranges
+
+    Parameters
+    ----------
+    indices: list[int]
+        Sorted list of unique indices.
+
+    Returns
+    -------
+    list[tuple[int, int]]:
+        list of (start, stop) tuples with 'range(start, stop)' covering the indices.
+
+    Examples
+    --------
+    >>> get_contiguous_ranges([0, 1, 2, 5, 6, 9])
+    [(0, 3), (5, 7), (9, 10)]
+    """
+    ranges = []
+    for idx in indices:
+        if ranges and ranges[-1][1] == idx:
+            ranges[-1][1] = idx + 1
+        else:
+            ranges.append([idx, idx + 1])
+    return [tuple(x) for x in ranges]
+
+
+def deblob(buffer: bytes, dtype, shape: tuple) -> np.ndarray:
+    """Convert a blob from the ase.db SQLite database to an array
+
+    Similar to 'ase.db.sqlite.SQLite3Database.deblob', which stores little endian data.
+    """
+    array = np.frombuffer(buffer, dtype)
+    if not np.little_endian:
+        array = array.byteswap()
+    return array.reshape(shape)
+
+
+def stack_per_frame_arrays(
+    values: typing.List[typing.Optional[np.ndarray]], dtype, shape: tuple, fill_value
+) -> np.ndarray:
+    """Stack per-frame arrays to (n_frames, *shape), replacing None with fill_value"""
+    if len(values) == 0:
+        return np.empty((0, *shape), dtype=dtype)
+    return np.stack([np.full(shape, fill_value) if x is None else x for x in values])
+
+
+def stack_per_atom_arrays(
+    values: typing.List[typing.Optional[np.ndarray]],
+    natoms: typing.List[int],
+    dtype,
+    shape: tuple,
+    ragged: bool,
+    fill_value,
+) -> typing.Union[np.ndarray, typing.Tuple[np.ndarray, np.ndarray]]:
+    """Combine per-atom arrays of frames with different numbers of atoms
+
+    Parameters
+    ----------
+    values: list[np.ndarray|None]
+        The per-atom array of every frame, None if the frame does not provide it.
+    natoms: list[int]
+        The number of atoms of every frame.
+    dtype:
+        The dtype of the values.
+    shape: tuple
+        The shape of the values per atom.
+    ragged: bool
+        Concatenate the values and return them with offsets instead of padding.
+    fill_value:
+        The value for padding and for frames where the value is None.
+
+    Returns
+    -------
+    np.ndarray | tuple[np.ndarray, np.ndarray]:
+        Either the padded array of shape (n_frames, max_natoms, *shape) or
+        the concatenated values of shape (total_natoms, *shape) and the offsets
+        of shape (n_frames + 1, ).
+    """
+    natoms = np.array(natoms, dtype=int)
+    offsets = np.concatenate([[0], np.cumsum(natoms)])
+    dtype = np.result_type(dtype, fill_value)
+    if ragged:
+        array = np.full((offsets[-1], *shape), fill_value, dtype=dtype)
+    else:
+        array = np.full(
+            (len(values), max(natoms, default=0), *shape), fill_value, dtype=dtype
+        )
+
+    for pos, value in enumerate(values):
+        if value is None:
+            continue
+        if ragged:
+            array[offsets[pos] : offsets[pos + 1]] = value
+        else:
+            array[pos, : natoms[pos]] = value
+    if ragged:
+        return array, offsets
+    return array
+
+
+def get_selection_mask(
+    keys: typing.List[str],
+    cmps: typing.List[tuple],
+    get_values: typing.Callable[[typing.Union[str, int]], np.ndarray],
+    n_frames: int,
+) -> np.ndarray:
+    """Evaluate a parsed 'ase.db' selection on per-frame values
+
+    Parameters
+    ----------
+    keys: list[str]
+        Keys that have to be present, see 'ase.db.core.parse_selection'.
+    cmps: list[tuple]
+        Comparisons '(key, op, value)', see 'ase.db.core.parse_selection'. Integer
+        keys are atomic numbers and compare the number of atoms of that element.
+    get_values: callable
+        Return the values of all frames for a key or atomic number. Missing values
+        are None or NaN and never match, like NULL in SQLite.
+    n_frames: int
+        The number of frames.
+
+    Returns
+    -------
+    np.ndarray:
+        Boolean mask of shape (n_frames, ) of the matching frames.
+    """
+    mask = np.ones(n_frames, dtype=bool)
+    for key, op, value in [(key, None, None) for key in keys] + list(cmps):
+        values = np.asarray(get_values(key))
+        if values.dtype.kind == "f":
+            found = ~np.isnan(values)
+        elif values.dtype == object:
+            found = np.array([x is not None for x in values], dtype=bool)
+        else:
+            found = np.ones(n_frames, dtype=bool)
+        if op is not None:
+            found[found] = ase.db.core.ops[op](values[found], value)
+        mask &= found
+    return mask
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "maxsize", "maxbytes", "currsize", "nbytes"],
+)
+
+
+def get_atoms_nbytes(atoms: ase.Atoms) -> int:
+    """Estimate the memory footprint of the arrays of an atoms object in bytes
+
+    This includes the per-atom arrays, the cell and the results of the calculator.
+    """
+    nbytes = atoms.cell.array.nbytes
+    nbytes += sum(value.nbytes for value in atoms.arrays.values())
+    if atoms.calc is not None:
+        nbytes += sum(np.asarray(value).nbytes for value in atoms.calc.results.values())
+    return nbytes
+
+
+class AtomsCache(collections.abc.MutableMapping):
+    """Least recently used cache for atoms objects
+
+    Attributes
+    ----------
+    maxsize: int
+        The maximum number of atoms objects to keep. None for no limit.
+    maxbytes: int
+        The maximum estimated memory of all atoms objects in bytes. None for no limit.
+    hits: int
+        Number of requested atoms objects that were found in the cache.
+    misses: int
+        Number of requested atoms objects that had to be loaded.
+    evictions: int
+        Number of atoms objects that were removed to fit the cache policy.
+    nbytes: int
+        The estimated memory of all atoms objects in the cache in bytes.
+    """
+
+    def __init__(self, maxsize: int = None, maxbytes: int = None):
+        """Default __init__
+
+        Parameters
+        ----------
+        maxsize: int, default = None
+            Maximum number of atoms objects to keep.
+        maxbytes: int, default = None
+            Maximum estimated memory of all atoms objects in bytes.
+            If both 'maxsize' and 'maxbytes' are None, the cache is unbounded.
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._data: typing.Dict[int, ase.Atoms] = collections.OrderedDict()
+        self._sizes: typing.Dict[int, int] = {}
+
+    def __getitem__(self, key) -> ase.Atoms:
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value: ase.Atoms):
+        if key in self._data:
+            del self[key]
+        self._data[key] = value
+        self._sizes[key] = get_atoms_nbytes(value)
+        self.nbytes += self._sizes[key]
+        self.evict()
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self.nbytes -= self._sizes.pop(key)
+
+    def __contains__(self, key) -> bool:
+        """Check for the key without marking it as recently used"""
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.info()})"
+
+    def _exceeds_limits(self) -> bool:
+        """Check if the cache holds more atoms or bytes than allowed"""
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            return True
+        return self.maxbytes is not None and self.nbytes > self.maxbytes
+
+    def evict(self):
+        """Remove the least recently used atoms until the cache fits the policy"""
+        while len(self._data) > 0 and self._exceeds_limits():
+            del self[next(iter(self._data))]
+            self.evictions += 1
+
+    def info(self) -> CacheInfo:
+        """Get the cache statistics, similar to 'functools.lru_cache'"""
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            maxsize=self.maxsize,
+            maxbytes=self.maxbytes,
+            currsize=len(self),
+            nbytes=self.nbytes,
+        )
+
 
 class LazyAtomsSequence(collections.abc.Sequence):
     """Sequence that loads atoms objects from ase Database only when accessed
 
     This sequence does not support modifications but only reading values from it.
+    Loaded atoms are kept in an 'AtomsCache' which is unbounded by default.
+    Use 'set_cache_policy' to limit the number of frames or the memory it can use.
+
+    Iterating over the sequence streams the atoms in chunks of 'chunk_size', while
+    the next 'prefetch' chunks are read from the database in a background thread.
+
+    All reads share a single read-only connection, which is opened on first access.
+    It is reopened after the sequence was pickled or the process forked and can be
+    closed via 'close()' or by using the sequence as a context manager.
+
+    Pickling only stores the database path, the index range and the settings but
+    neither the loaded atoms nor the connection. Together with 'view' this allows
+    sending parts of the sequence to worker processes, which read them on their own.
+
+    Examples
+    --------
+    >>> with concurrent.futures.ProcessPoolExecutor() as executor:
+    >>>     views = [sequence.view(x, None, 4) for x in range(4)]
+    >>>     energies = executor.map(compute, views)
     """
 
-    def __init__(self, database: str, threshold: int = 100):
+    def __init__(
+        self,
+        database: str,
+        threshold: int = 100,
+        maxsize: int = None,
+        maxbytes: int = None,
+        chunk_size: int = 100,
+        prefetch: int = 1,
+    ):
         """Default __init__
 
         Parameters
@@ -33,39 +434,305 @@ class LazyAtomsSequence(collections.abc.Sequence):
             The database to read from
         threshold: int
             Minimum number of atoms to read at once to print tqdm loading bars
+        maxsize: int, default = None
+            Maximum number of atoms objects to keep in memory.
+        maxbytes: int, default = None
+            Maximum estimated memory of the atoms objects to keep in memory in bytes.
+            If both 'maxsize' and 'maxbytes' are None, all loaded atoms are kept.
+        chunk_size: int, default = 100
+            Number of atoms to read at once when iterating over the sequence.
+        prefetch: int, default = 1
+            Number of chunks to read ahead in the background when iterating.
         """
         self._database = database
         self._threshold = threshold
-        self.__dict__["atoms"]: typing.Dict[int, ase.Atoms] = {}
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self._connection: ase.db.core.Database = None
+        self._connection_pid: int = None
+        self._lock = threading.RLock()
+        self.__dict__["atoms"]: AtomsCache = AtomsCache(
+            maxsize=maxsize, maxbytes=maxbytes
+        )
         self._len = None
+        # the database indices of this sequence as a range or a list from 'select',
+        # None for all atoms in the database
+        self._range: typing.Sequence[int] = None
+
+    def __enter__(self) -> "LazyAtomsSequence":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self) -> dict:
+        """Only pickle the database path, the index range and the settings
+
+        Loaded atoms are not pickled and the connection is reopened lazily.
+        """
+        cache: AtomsCache = self.__dict__["atoms"]
+        return {
+            "database": self._database,
+            "threshold": self._threshold,
+            "maxsize": cache.maxsize,
+            "maxbytes": cache.maxbytes,
+            "chunk_size": self.chunk_size,
+            "prefetch": self.prefetch,
+            "index_range": self._range,
+        }
+
+    def __setstate__(self, state: dict):
+        state = state.copy()
+        index_range = state.pop("index_range")
+        self.__init__(**state)
+        self._range = index_range
+
+    def view(self, start: int = None, stop: int = None, step: int = None):
+        """Get a sub-sequence of the atoms 'start:stop:step' that does not hold any data
+
+        The view has its own, empty cache and connection and the same settings as
+        this sequence. It is cheap to pickle and can be sent to other processes.
+
+        Parameters
+        ----------
+        start, stop, step: int, default = None
+            The same as for 'slice(start, stop, step)'.
+
+        Returns
+        -------
+        LazyAtomsSequence:
+            A sequence of the same type over the selected atoms.
+        """
+        return self._get_sequence(self._get_range()[start:stop:step])
+
+    def select(self, selection=None, **kwargs) -> "LazyAtomsSequence":
+        """Get a sub-sequence of the atoms that match a database query
+
+        The query is evaluated by SQLite using the indices of the database, see
+        'AtomsWriter', and no atoms are read. The order of this sequence is kept.
+
+        Parameters
+        ----------
+        selection: str|int|list, default = None
+            The selection in the syntax of 'ase.db', e.g. "energy<-1.5,O" for all
+            atoms with an energy below -1.5 that contain oxygen or "natoms>10".
+        kwargs:
+            Key value pairs that have to match, e.g. 'group="MyNode"'.
+
+        Returns
+        -------
+        LazyAtomsSequence:
+            A sequence of the same type over the matching atoms. Like 'view' it
+            does not hold any data.
+
+        References
+        ----------
+        https://wiki.fysik.dtu.dk/ase/ase/db/db.html#querying
+        """
+        keys, cmps = ase.db.core.parse_selection(selection, **kwargs)
+        with self._connect() as database, database.managed_connection() as con:
+            statement, args = database.create_select_statement(
+                keys, cmps, what="systems.id"
+            )
+            matches = {row[0] - 1 for row in con.execute(statement, args)}
+        return self._get_sequence([idx for idx in self._get_range() if idx in matches])
+
+    def _get_sequence(self, db_indices: typing.Sequence[int]) -> "LazyAtomsSequence":
+        """Get a new sequence over the given database indices without any data"""
+        sequence = pickle.loads(pickle.dumps(self))
+        sequence._range = db_indices
+        return sequence
+
+    def _get_range(self) -> typing.Sequence[int]:
+        """The database indices of this sequence"""
+        if self._range is None:
+            return range(len(self))
+        return self._range
+
+    def _get_db_indices(self, indices: typing.Iterable[int]) -> typing.Dict[int, int]:
+        """Map the database indices to the given indices of this sequence"""
+        if self._range is None:
+            return {idx: idx for idx in indices}
+        return {self._range[idx]: idx for idx in indices}
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.ContextManager[ase.db.core.Database]:
+        """Yield the long-lived, read-only database connection
+
+        The connection is opened on first use and reopened if the process was forked.
+        Access is serialized, so the connection can be shared with the prefetch thread.
+        """
+        if self._connection_pid != os.getpid():
+            # Never reuse (or close) a connection that was inherited from the parent
+            self._lock = threading.RLock()
+            self._connection = None
+            self._connection_pid = os.getpid()
+
+        with self._lock:
+            if self._connection is None:
+                self._connection = ase.db.connect(self._database)
+                if isinstance(self._connection, ase.db.sqlite.SQLite3Database):
+                    self._connection.change_count = 0
+                    self._connection.connection = sqlite3.connect(
+                        f"{pathlib.Path(self._database).resolve().as_uri()}?mode=ro",
+                        uri=True,
+                        timeout=20,
+                        check_same_thread=False,
+                    )
+            yield self._connection
+
+    def close(self):
+        """Close the database connection. It will be reopened on the next access."""
+        with self._lock:
+            connection = getattr(self._connection, "connection", None)
+            if connection is not None and self._connection_pid == os.getpid():
+                connection.close()
+            self._connection = None
+
+    def set_cache_policy(self, maxsize: int = None, maxbytes: int = None):
+        """Change the limits of the atoms cache
+
+        Parameters
+        ----------
+        maxsize: int, default = None
+            Maximum number of atoms objects to keep in memory.
+        maxbytes: int, default = None
+            Maximum estimated memory of the atoms objects to keep in memory in bytes.
+            If both 'maxsize' and 'maxbytes' are None, all loaded atoms are kept.
+        """
+        cache: AtomsCache = self.__dict__["atoms"]
+        cache.maxsize = maxsize
+        cache.maxbytes = maxbytes
+        cache.evict()
+
+    def cache_info(self) -> CacheInfo:
+        """Get hits, misses, evictions and the size of the atoms cache"""
+        return self.__dict__["atoms"].info()
+
+    def _read_from_db(
+        self, indices: list, show_progress: bool = True
+    ) -> typing.Dict[int, ase.Atoms]:
+        """Read atoms from the database without using the cache
+
+        The indices are merged into contiguous ranges and every range is read
+        with a single query, instead of one query per atoms object.
+
+        Parameters
+        ----------
+        indices: list
+            The indices of the atoms. Indices are 0based and will be converted to 1 based
+            when reading from the ase db.
+        show_progress: bool, default = True
+            Show a tqdm loading bar if more than 'threshold' atoms are read.
+
+        Returns
+        -------
+        dict[int, Atoms]:
+            The atoms for the given indices.
+        """
+        db_indices = self._get_db_indices(indices)
+        atoms = {}
+        if len(db_indices) == 0:
+            return atoms
+
+        with self._connect() as database, tqdm.tqdm(
+            total=len(db_indices),
+            disable=not show_progress or len(db_indices) < self._threshold,
+            ncols=120,
+            desc=f"Loading atoms from {self._database}",
+        ) as progress_bar:
+            for start, stop in get_contiguous_ranges(sorted(db_indices)):
+                selection = [("id", ">", start), ("id", "<=", stop)]
+                for row in database.select(selection):
+                    atoms[db_indices[row.id - 1]] = row.toatoms()
+                    progress_bar.update()
+        return atoms
 
-    def _update_state_from_db(self, indices: list):
+    def _update_state_from_db(self, indices: list) -> typing.Dict[int, ase.Atoms]:
         """Load requested atoms into memory
 
-        If the atoms are not present in __dict__ they will be read from db
+        If the atoms are not present in __dict__ they will be read from db.
 
         Parameters
         ----------
         indices: list
             The indices of the atoms. Indices are 0based and will be converted to 1 based
             when reading from the ase db.
+
+        Returns
+        -------
+        dict[int, Atoms]:
+            The requested atoms. Because the cache can evict atoms while loading,
+            the returned dictionary should be used instead of the cache.
         """
-        indices = [x for x in indices if x not in self.__dict__["atoms"]]
+        cache: AtomsCache = self.__dict__["atoms"]
+        atoms = {}
+        for idx in dict.fromkeys(indices):
+            try:
+                atoms[idx] = cache[idx]
+                cache.hits += 1
+            except KeyError:
+                cache.misses += 1
+        loaded = self._read_from_db([x for x in indices if x not in atoms])
+        for idx, value in loaded.items():
+            atoms[idx] = cache[idx] = value
+        return atoms
 
-        with ase.db.connect(self._database) as database:
-            for key in tqdm.tqdm(
-                indices,
-                disable=len(indices) < self._threshold,
-                ncols=120,
-                desc=f"Loading atoms from {self._database}",
-            ):
-                self.__dict__["atoms"][key] = database[key + 1].toatoms()
+    def iter_prefetch(
+        self, chunk_size: int = None, prefetch: int = None
+    ) -> typing.Iterator[ase.Atoms]:
+        """Iterate over the sequence and read the next chunks in a background thread
+
+        The atoms of the current chunk are yielded while the next chunks are read from
+        the database, which overlaps database I/O with the work done by the consumer.
+        At most 'chunk_size * (prefetch + 1)' atoms are held by the iterator.
+
+        Parameters
+        ----------
+        chunk_size: int, default = None
+            Number of atoms to read at once. Defaults to 'self.chunk_size'.
+        prefetch: int, default = None
+            Number of chunks to read ahead. Defaults to 'self.prefetch'.
+
+        Yields
+        ------
+        Atoms:
+            The atoms of the sequence in order.
+        """
+        chunk_size = max(chunk_size or self.chunk_size, 1)
+        prefetch = self.prefetch if prefetch is None else prefetch
+        cache: AtomsCache = self.__dict__["atoms"]
+        # the cache is only checked in this thread, when the chunk is submitted
+        chunks = (
+            (chunk, [x for x in chunk if x not in cache])
+            for chunk in (
+                range(start, min(start + chunk_size, len(self)))
+                for start in range(0, len(self), chunk_size)
+            )
+        )
+
+        def read_chunk(item: tuple) -> tuple:
+            chunk, missing = item
+            return chunk, self._read_from_db(missing, False)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            loaded_chunks = iter_bounded(executor, read_chunk, chunks, prefetch + 1)
+            with contextlib.closing(loaded_chunks):
+                for chunk, loaded in loaded_chunks:
+                    for idx in chunk:
+                        if idx in loaded:
+                            cache.misses += 1
+                            atoms = cache[idx] = loaded.pop(idx)
+                            yield atoms
+                        else:
+                            yield self[idx]
 
     def __iter__(self):
-        """Enable iterating over the sequence. This will load all data at once"""
-        self._update_state_from_db(list(range(len(self))))
-        for idx in range(len(self)):
-            yield self[idx]
+        """Enable iterating over the sequence.
+
+        The atoms are streamed in chunks, see 'iter_prefetch'.
+        """
+        yield from self.iter_prefetch()
 
     def __getitem__(self, item) -> typing.Union[ase.Atoms, AtomsList]:
         """Get atoms
@@ -82,28 +749,24 @@ class LazyAtomsSequence(collections.abc.Sequence):
         """
         if isinstance(item, int):
             # The most simple case
-            try:
-                return self.__dict__["atoms"][item]
-            except KeyError:
-                self._update_state_from_db([item])
-                return self.__dict__["atoms"][item]
+            item = range(len(self))[item]  # raises IndexError and handles negatives
+            return self._update_state_from_db([item])[item]
         # everything with lists
         if isinstance(item, slice):
             item = list(range(len(self)))[item]
 
-        try:
-            return [self.__dict__["atoms"][x] for x in item]
-        except KeyError:
-            self._update_state_from_db(item)
-            return [self.__dict__["atoms"][x] for x in item]
+        atoms = self._update_state_from_db(item)
+        return [atoms[x] for x in item]
 
     def __len__(self):
         """Get the len based on the db. This value is cached because
         the db is not expected to change during the lifetime of this class
         """
+        if self._range is not None:
+            return len(self._range)
         if self._len is None:
-            with ase.db.connect(self._database) as db:
-                self._len = len(db)
+            with self._connect() as database:
+                self._len = len(database)
         return self._len
 
     def __repr__(self):
@@ -113,41 +776,1253 @@ class LazyAtomsSequence(collections.abc.Sequence):
         """Convert sequence to a list of atoms objects"""
         return list(self)
 
+    def _get_indices(self, indices=None) -> typing.List[int]:
+        """Convert None | slice | list to a list of indices
+
+        Negative indices count from the end and indices out of range raise an
+        IndexError, as for '__getitem__'.
+        """
+        index_range = range(len(self))
+        if indices is None:
+            return list(index_range)
+        if isinstance(indices, slice):
+            return list(index_range[indices])
+        return [index_range[idx] for idx in indices]
+
+    def _read_columns(
+        self, indices: typing.List[int], columns: typing.List[str]
+    ) -> typing.Dict[int, tuple]:
+        """Read raw columns from the 'systems' table of the SQLite database
+
+        Parameters
+        ----------
+        indices: list[int]
+            The 0based indices of the rows to read.
+        columns: list[str]
+            Names of the columns to read. Only trusted names must be used here.
+
+        Returns
+        -------
+        dict[int, tuple]:
+            The raw column values for every index, in the order of 'columns'.
+        """
+        values = {}
+        db_indices = self._get_db_indices(indices)
+        statement = (
+            f"SELECT id, {', '.join(columns)} FROM systems WHERE id > ? AND id <= ?"
+        )
+        with self._connect() as database, database.managed_connection() as con:
+            for start, stop in get_contiguous_ranges(sorted(db_indices)):
+                for row in con.execute(statement, (start, stop)):
+                    values[db_indices[row[0] - 1]] = row[1:]
+        return values
+
+    def get_array(
+        self, name: str, indices=None, ragged: bool = False, fill_value=np.nan
+    ) -> typing.Union[np.ndarray, typing.Tuple[np.ndarray, np.ndarray]]:
+        """Read an array for many atoms without building 'ase.Atoms' objects
+
+        The values are read directly from the columns of the database and are not
+        cached.
+
+        Parameters
+        ----------
+        name: str
+            A per-atom array, one of 'PER_ATOM_COLUMNS', e.g. 'positions' or 'forces'
+            or a per-frame array, one of 'PER_FRAME_COLUMNS', e.g. 'cell' or 'stress'.
+        indices: list | slice, default = None
+            The indices of the atoms to read. Defaults to all atoms.
+        ragged: bool, default = False
+            Return per-atom arrays as concatenated values with offsets instead of
+            a padded array.
+        fill_value: default = np.nan
+            The value for padding and for atoms without the requested property.
+
+        Returns
+        -------
+        np.ndarray | tuple[np.ndarray, np.ndarray]:
+            Per-frame arrays are stacked to shape (n_frames, ...).
+            Per-atom arrays are padded with 'fill_value' to (n_frames, max_natoms, ...).
+            If 'ragged', a tuple of 'values' with shape (total_natoms, ...) and
+            'offsets' with shape (n_frames + 1, ) is returned instead, so that the
+            i-th frame is 'values[offsets[i]:offsets[i + 1]]'.
+        """
+        indices = self._get_indices(indices)
+        if name not in PER_ATOM_COLUMNS and name not in PER_FRAME_COLUMNS:
+            raise KeyError(
+                f"Can not read '{name}' from the database. Use one of"
+                f" {list(PER_ATOM_COLUMNS) + list(PER_FRAME_COLUMNS)}."
+            )
+        rows = self._read_columns(indices, ["natoms", name])
+
+        if name in PER_FRAME_COLUMNS:
+            dtype, shape = PER_FRAME_COLUMNS[name]
+            values = []
+            for idx in indices:
+                value = rows[idx][1]
+                if value is None:
+                    values.append(None)
+                elif name == "pbc":
+                    values.append((value & np.array([1, 2, 4])).astype(bool))
+                else:
+                    values.append(deblob(value, dtype, shape))
+            return stack_per_frame_arrays(values, dtype, shape, fill_value)
+
+        dtype, shape = PER_ATOM_COLUMNS[name]
+        values = [
+            None if rows[idx][1] is None else deblob(rows[idx][1], dtype, (-1, *shape))
+            for idx in indices
+        ]
+        natoms = [rows[idx][0] for idx in indices]
+        return stack_per_atom_arrays(values, natoms, dtype, shape, ragged, fill_value)
+
+    def get_info(self, key: str, indices=None, default=np.nan) -> np.ndarray:
+        """Read a per-frame property without building 'ase.Atoms' objects
+
+        Parameters
+        ----------
+        key: str
+            One of the 'SCALAR_COLUMNS', e.g. 'energy' or any key of the
+            key_value_pairs stored with the atoms.
+        indices: list | slice, default = None
+            The indices of the atoms to read. Defaults to all atoms.
+        default: default = np.nan
+            The value for atoms without the requested property.
+
+        Returns
+        -------
+        np.ndarray:
+            The values of shape (n_frames, ).
+        """
+        indices = self._get_indices(indices)
+        if key in SCALAR_COLUMNS:
+            rows = self._read_columns(indices, [key])
+            values = [rows[idx][0] for idx in indices]
+        else:
+            rows = self._read_columns(indices, ["key_value_pairs"])
+            values = [json.loads(rows[idx][0]).get(key) for idx in indices]
+        return np.array([default if x is None else x for x in values])
+
+
+class ColumnarAtomsSequence(LazyAtomsSequence):
+    """LazyAtomsSequence over the '.npy' files written by 'write_atoms_to_npy'
+
+    The files are memory-mapped (copy-on-write) on first access. The arrays of
+    the returned atoms and the results of their calculators are views into these
+    memory maps, so reading a frame does not copy the per-atom data.
+    """
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.ContextManager[typing.Dict[str, np.ndarray]]:
+        """Yield the memory-mapped columns"""
+        with self._lock:
+            if self._connection is None:
+                self._connection = {
+                    file.stem: np.load(file, mmap_mode="c")
+                    for file in pathlib.Path(self._database).glob("*.npy")
+                }
+            yield self._connection
+
+    def close(self):
+        """Release the memory maps. They will be reopened on the next access."""
+        with self._lock:
+            self._connection = None
+
+    def __len__(self):
+        if self._range is not None:
+            return len(self._range)
+        with self._connect() as columns:
+            return len(columns["offsets"]) - 1
+
+    @staticmethod
+    def _get_atoms(columns: typing.Dict[str, np.ndarray], idx: int) -> ase.Atoms:
+        """Build the atoms object from views into the columns"""
+        start, stop = columns["offsets"][idx : idx + 2]
+        atoms = ase.Atoms(cell=columns["cell"][idx], pbc=columns["pbc"][idx])
+        atoms.arrays["numbers"] = columns["numbers"][start:stop]
+        atoms.arrays["positions"] = columns["positions"][start:stop]
+
+        results = {}
+        if "energy" in columns and not np.isnan(columns["energy"][idx]):
+            results["energy"] = float(columns["energy"][idx])
+        if "forces" in columns and not np.isnan(columns["forces"][start:stop]).all():
+            results["forces"] = columns["forces"][start:stop]
+        if "stress" in columns and not np.isnan(columns["stress"][idx]).all():
+            results["stress"] = columns["stress"][idx]
+        if len(results) > 0:
+            atoms.calc = ase.calculators.singlepoint.SinglePointCalculator(atoms)
+            atoms.calc.results.update(results)
+        return atoms
+
+    def select(self, selection=None, **kwargs) -> "ColumnarAtomsSequence":
+        """Get a sub-sequence of the atoms that match a query on the stored columns
+
+        See 'LazyAtomsSequence.select'. Only 'natoms', 'energy' and the elements,
+        e.g. "energy<-1.5,O" or "natoms>10,H=2", can be queried, because the
+        '.npy' files do not store other keys.
+
+        Raises
+        ------
+        KeyError:
+            If the selection uses any other key.
+        """
+        keys, cmps = ase.db.core.parse_selection(selection, **kwargs)
+        index_range = self._get_range()
+
+        def get_values(key: typing.Union[str, int]) -> np.ndarray:
+            if not isinstance(key, int):
+                return self.get_info(key)
+            with self._connect() as columns:
+                offsets = columns["offsets"]
+                frames = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+                counts = np.bincount(
+                    frames[columns["numbers"] == key], minlength=len(offsets) - 1
+                )
+            return counts[index_range]
+
+        mask = get_selection_mask(keys, cmps, get_values, len(index_range))
+        return self._get_sequence([idx for idx, x in zip(index_range, mask) if x])
+
+    def _get_column_indices(self, indices=None) -> typing.List[int]:
+        """Convert None | slice | list to a list of indices into the columns"""
+        index_range = self._get_range()
+        return [index_range[idx] for idx in self._get_indices(indices)]
+
+    def _read_from_db(
+        self, indices: list, show_progress: bool = True
+    ) -> typing.Dict[int, ase.Atoms]:
+        """Build the atoms for the given indices from the memory-mapped columns"""
+        db_indices = self._get_db_indices(indices)
+        with self._connect() as columns:
+            return {
+                idx: self._get_atoms(columns, db_idx)
+                for db_idx, idx in sorted(db_indices.items())
+            }
+
+    def get_array(
+        self, name: str, indices=None, ragged: bool = False, fill_value=np.nan
+    ) -> typing.Union[np.ndarray, typing.Tuple[np.ndarray, np.ndarray]]:
+        """Read an array for many atoms without building 'ase.Atoms' objects
+
+        See 'LazyAtomsSequence.get_array'. Available are the per-atom arrays
+        'numbers', 'positions' and 'forces' and the per-frame arrays 'cell', 'pbc'
+        and 'stress'. Requesting all frames with 'ragged' returns the memory maps
+        without copying.
+        """
+        indices = self._get_column_indices(indices)
+        with self._connect() as columns:
+            if name not in columns or name in ["offsets", "energy"]:
+                raise KeyError(
+                    f"Can not read '{name}' from {self._database}. Use one of"
+                    f" {[x for x in columns if x not in ['offsets', 'energy']]}."
+                )
+            values, offsets = columns[name], columns["offsets"]
+            if name not in PER_ATOM_COLUMNS:
+                return np.asarray(values[indices])
+            if ragged and indices == list(range(len(offsets) - 1)):
+                return values, offsets
+            return stack_per_atom_arrays(
+                [values[offsets[idx] : offsets[idx + 1]] for idx in indices],
+                np.diff(offsets)[indices],
+                values.dtype,
+                values.shape[1:],
+                ragged,
+                fill_value,
+            )
+
+    def get_info(self, key: str, indices=None, default=np.nan) -> np.ndarray:
+        """Read a per-frame property without building 'ase.Atoms' objects
+
+        See 'LazyAtomsSequence.get_info'. Available are 'energy' and 'natoms'.
+        'default' replaces missing energies.
+
+        Raises
+        ------
+        KeyError:
+            If the key is not stored in the '.npy' files.
+        """
+        indices = self._get_column_indices(indices)
+        with self._connect() as columns:
+            if key == "natoms":
+                return np.diff(columns["offsets"])[indices]
+            if key == "energy" and key in columns:
+                values = np.asarray(columns[key][indices])
+                return np.where(np.isnan(values), default, values)
+        raise KeyError(
+            f"Can not read '{key}' from {self._database}. Use 'natoms' or 'energy'."
+        )
+
+
+def _atoms_to_dict(atoms: ase.Atoms) -> dict:
+    """Same as 'ase.db.row.atoms2dict' but checks the calculator state only once
+
+    'atoms2dict' calls 'check_state' for every property, which dominates the time
+    to write atoms with results to the database.
+    """
+    calc = atoms.calc
+    if calc is None or len(calc.check_state(atoms)) != 0:
+        return ase.db.row.atoms2dict(atoms)
+    dct = ase.db.row.atoms2dict(atoms.copy())
+    dct["calculator"] = calc.name.lower()
+    dct["calculator_parameters"] = calc.todict()
+    for prop in ase.calculators.calculator.all_properties:
+        if calc.results.get(prop) is not None:
+            value = calc.results[prop]
+            dct[prop] = value.copy() if isinstance(value, np.ndarray) else value
+    return dct
+
+
+def _get_row_values(
+    database: ase.db.sqlite.SQLite3Database,
+    atoms: ase.Atoms,
+    key_value_pairs: dict,
+    mtime: float,
+) -> typing.Tuple[ase.db.row.AtomsRow, tuple]:
+    """Convert atoms into the values of a row in the 'systems' table
+
+    This follows 'ase.db.sqlite.SQLite3Database._write' but without the database
+    round trips, so that the rows can be inserted in batches.
+    """
+    row = ase.db.row.AtomsRow(_atoms_to_dict(atoms))
+    constraints = row._constraints
+    constraints = database.encode(constraints) if constraints else None
+    data = row._data
+    if not isinstance(data, (str, bytes)):
+        data = database.encode(data, binary=database.version >= 9)
+
+    values = (
+        row.unique_id,
+        mtime,
+        mtime,
+        os.getenv("USER"),
+        database.blob(row.numbers),
+        database.blob(row.positions),
+        database.blob(row.cell),
+        int(np.dot(row.pbc, [1, 2, 4])),
+        database.blob(row.get("initial_magmoms")),
+        database.blob(row.get("initial_charges")),
+        database.blob(row.get("masses")),
+        database.blob(row.get("tags")),
+        database.blob(row.get("momenta")),
+        constraints,
+    )
+    if "calculator" in row:
+        values += (row.calculator, database.encode(row.calculator_parameters))
+    else:
+        values += (None, None)
+    values += (
+        row.get("energy"),
+        row.get("free_energy"),
+        database.blob(row.get("forces")),
+        database.blob(row.get("stress")),
+        database.blob(row.get("dipole")),
+        database.blob(row.get("magmoms")),
+        row.get("magmom"),
+        database.blob(row.get("charges")),
+        database.encode(key_value_pairs),
+        data,
+        len(row.numbers),
+        ase.db.sqlite.float_if_not_none(row.get("fmax")),
+        ase.db.sqlite.float_if_not_none(row.get("smax")),
+        ase.db.sqlite.float_if_not_none(row.get("volume")),
+        float(row.mass),
+        float(row.charge),
+    )
+    return row, values
+
+
+class AtomsWriter(collections.abc.Sequence):
+    """Append atoms to an ase.db SQLite database in batches
+
+    The rows are the same as with 'db.write(atoms, **key_value_pairs)' for every atoms
+    object, but 'commit_interval' rows are inserted with a single 'executemany' per
+    table in one transaction. If the first batch has more rows than the database
+    already contains, e.g. for a new database, the indices are dropped while writing
+    and rebuilt on 'close()'. Otherwise, e.g. when appending a few atoms to a large
+    database, the indices are updated with every batch instead of being rebuilt over
+    the whole table. On 'close()', the 'SELECT_INDEX_STATEMENTS' that speed up
+    'LazyAtomsSequence.select' are created if necessary. Batches that were
+    committed before an error are kept.
+
+    The atoms are converted to rows when they are appended, so they can be modified
+    afterward. With 'background=True' the batches are inserted by a separate thread,
+    which overlaps the database I/O with the computation of the next atoms.
+
+    Reading from the writer, e.g. 'writer[0]', flushes all appended atoms and reads
+    them back from the database. Only the appended atoms can be read.
+
+    The 'metadata' of the database is cleared when the writer is opened and only
+    written after all atoms were inserted successfully, so it can be used to store
+    information about complete writes.
+
+    Examples
+    --------
+    >>> with AtomsWriter("atoms.db", background=True, group="md") as writer:
+    >>>     for atoms in simulation:
+    >>>         writer.append(atoms)
+    """
+
+    def __init__(
+        self,
+        file: typing.Union[str, pathlib.Path],
+        commit_interval: int = 1000,
+        append: bool = False,
+        background: bool = False,
+        metadata: dict = None,
+        **key_value_pairs,
+    ):
+        """Default __init__
+
+        Parameters
+        ----------
+        file: str|Path
+            The database file.
+        commit_interval: int, default = 1000
+            Number of rows to insert and commit at once.
+        append: bool, default = False
+            Append to an existing database instead of replacing it.
+        background: bool, default = False
+            Insert the batches in a background thread.
+        metadata: dict, default = None
+            JSON serializable metadata to store in the database on 'close()'.
+        key_value_pairs:
+            Key value pairs to store with every atoms object, e.g. 'group'.
+        """
+        ase.db.core.check(key_value_pairs)
+        self.file = pathlib.Path(file)
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.commit_interval = commit_interval
+        self.key_value_pairs = key_value_pairs
+
+        self._database = ase.db.connect(self.file, append=append)
+        # creates the tables and counts the rows of an existing database
+        self._n_existing_rows = len(self._database)
+        self.metadata = metadata
+        if metadata is not None:
+            self._database.metadata = {}
+
+        self._batch = []
+        self._n_rows = 0
+        self._connection: sqlite3.Connection = None
+        self._indices: typing.List[typing.Tuple[str, str]] = []
+        self._next_id: int = None
+        self._reader: LazyAtomsSequence = None
+        self._closed = False
+
+        self._queue: queue.Queue = None
+        self._thread: threading.Thread = None
+        self._error: BaseException = None
+        if background:
+            # at most two batches wait for the writer thread
+            self._queue = queue.Queue(maxsize=2)
+            self._thread = threading.Thread(target=self._write_queue, daemon=True)
+            self._thread.start()
+
+    def __enter__(self) -> "AtomsWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of appended atoms"""
+        return self._n_rows
+
+    def __getitem__(self, item) -> typing.Union[ase.Atoms, AtomsList]:
+        """Read appended atoms back from the database, see 'LazyAtomsSequence'"""
+        self.flush()
+        if self._reader is None:
+            self._reader = LazyAtomsSequence(self.file.resolve().as_posix())
+        # rows appended to the database are visible with the extended range
+        self._reader._range = range(
+            self._n_existing_rows, self._n_existing_rows + len(self)
+        )
+        if isinstance(item, slice):
+            item = list(range(len(self)))[item]
+        elif isinstance(item, numbers.Integral):
+            item = range(len(self))[item]  # raises IndexError and handles negatives
+        return self._reader[item]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(db={self.file})"
+
+    def append(self, atoms: ase.Atoms):
+        """Add atoms to the current batch and insert the batch if it is full"""
+        if self._closed:
+            raise ValueError(f"Can not append to closed {self}.")
+        self._raise_background_error()
+        row, values = _get_row_values(
+            self._database, atoms, self.key_value_pairs, ase.db.core.now()
+        )
+        # the blobs are memoryviews of the atoms arrays and must not change later
+        values = tuple(bytes(x) if isinstance(x, memoryview) else x for x in values)
+        species = [
+            (ase.data.atomic_numbers[symbol], count)
+            for symbol, count in row.count_atoms().items()
+        ]
+        self._batch.append((values, species))
+        self._n_rows += 1
+        if len(self._batch) >= self.commit_interval:
+            self._submit_batch()
+
+    def extend(self, atoms: typing.Iterable[ase.Atoms]):
+        """Append all atoms of an iterable, e.g. a generator"""
+        for atom in atoms:
+            self.append(atom)
+
+    def flush(self):
+        """Insert all appended atoms and wait until they are committed"""
+        if len(self._batch) > 0:
+            self._submit_batch()
+        if self._queue is not None:
+            self._queue.join()
+        self._raise_background_error()
+
+    def close(self):
+        """Insert all appended atoms, rebuild the indices and close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if len(self._batch) > 0:
+                self._submit_batch()
+        finally:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+            else:
+                self._close_connection()
+        self._raise_background_error()
+        if self.metadata is not None:
+            self._database.metadata = self.metadata
+
+    def _raise_background_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _submit_batch(self):
+        batch, self._batch = self._batch, []
+        if self._queue is None:
+            self._write_batch(batch)
+        else:
+            self._queue.put(batch)
+
+    def _write_queue(self):
+        """Insert the batches from the queue until 'None' is received"""
+        try:
+            while True:
+                batch = self._queue.get()
+                try:
+                    if batch is None:
+                        break
+                    if self._error is None:
+                        self._write_batch(batch)
+                except BaseException as err:  # noqa: B902
+                    self._error = err
+                finally:
+                    self._queue.task_done()
+        finally:
+            self._close_connection()
+
+    def _open_connection(self, n_new_rows: int) -> sqlite3.Connection:
+        """Open the connection in the writing thread
+
+        The indices are dropped if the first batch with 'n_new_rows' rows is larger
+        than the existing database, so rebuilding them on close is cheaper than
+        updating them.
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.file, timeout=20)
+            if n_new_rows > self._n_existing_rows:
+                self._indices = self._connection.execute(
+                    "SELECT name, sql FROM sqlite_master WHERE type='index' AND sql IS"
+                    " NOT NULL"
+                ).fetchall()
+            for name, _ in self._indices:
+                self._connection.execute(f"DROP INDEX {name}")
+            self._next_id = self._database.get_last_id(self._connection.cursor()) + 1
+        return self._connection
+
+    def _close_connection(self):
+        """Rebuild the indices, create the 'SELECT_INDEX_STATEMENTS' and close"""
+        if self._connection is None:
+            return
+        try:
+            self._connection.rollback()
+            # also restores the indices of 'ase.db' after an interrupted write
+            ase_statements = [
+                x.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS")
+                for x in ase.db.sqlite.index_statements
+            ]
+            indices = [x for _, x in self._indices] + ase_statements
+            for sql in indices + SELECT_INDEX_STATEMENTS:
+                self._connection.execute(sql)
+            self._connection.commit()
+        finally:
+            self._connection.close()
+            self._connection = None
+
+    def _write_batch(self, batch: list):
+        """Insert the rows of a batch in a single transaction"""
+        con = self._open_connection(len(batch))
+        systems, species, text_values, number_values, keys = [], [], [], [], []
+        for row_id, (values, counts) in enumerate(batch, start=self._next_id):
+            systems.append((row_id,) + values)
+            species += [(number, count, row_id) for number, count in counts]
+            for key, value in self.key_value_pairs.items():
+                if isinstance(value, (numbers.Real, np.bool_)):
+                    number_values.append((key, float(value), row_id))
+                else:
+                    text_values.append((key, value, row_id))
+                keys.append((key, row_id))
+
+        try:
+            placeholders = ", ".join("?" * len(systems[0]))
+            con.executemany(f"INSERT INTO systems VALUES ({placeholders})", systems)
+            con.executemany("INSERT INTO species VALUES (?, ?, ?)", species)
+            con.executemany("INSERT INTO text_key_values VALUES (?, ?, ?)", text_values)
+            con.executemany(
+                "INSERT INTO number_key_values VALUES (?, ?, ?)", number_values
+            )
+            con.executemany("INSERT INTO keys VALUES (?, ?)", keys)
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        self._next_id += len(batch)
+
+
+def write_atoms_to_db(
+    file: typing.Union[str, pathlib.Path],
+    atoms: typing.Iterable[ase.Atoms],
+    commit_interval: int = 1000,
+    append: bool = False,
+    background: bool = False,
+    **key_value_pairs,
+) -> int:
+    """Write atoms to an ase.db SQLite database using batched inserts
+
+    See 'AtomsWriter' for details.
+
+    Parameters
+    ----------
+    file: str|Path
+        The database file.
+    atoms: Iterable[Atoms]
+        The atoms to write. This can be a generator.
+    commit_interval: int, default = 1000
+        Number of rows to insert and commit at once.
+    append: bool, default = False
+        Append to an existing database instead of replacing it.
+    background: bool, default = False
+        Insert the batches in a background thread, while 'atoms' is consumed.
+    key_value_pairs:
+        Key value pairs to store with every atoms object, e.g. 'group'.
+
+    Returns
+    -------
+    int: The number of rows written.
+    """
+    with AtomsWriter(
+        file,
+        commit_interval=commit_interval,
+        append=append,
+        background=background,
+        **key_value_pairs,
+    ) as writer:
+        writer.extend(atoms)
+    return len(writer)
+
+
+def write_atoms_to_npy(
+    directory: typing.Union[str, pathlib.Path], atoms: typing.Iterable[ase.Atoms]
+) -> int:
+    """Write atoms as contiguous per-property arrays into a directory of '.npy' files
+
+    The atoms are written one by one, so a generator is never held in memory. The
+    per-atom arrays 'numbers', 'positions' and 'forces' are concatenated over
+    all frames with 'offsets' marking the first atom of every frame. The per-frame
+    properties 'cell', 'pbc', 'energy' and 'stress' are stacked. Missing results are
+    stored as NaN and results that no frame provides are not written at all.
+    Other properties, e.g. 'info', constraints or tags are not stored.
+
+    Parameters
+    ----------
+    directory: str|Path
+        The directory to write to. Existing content will be removed.
+    atoms: Iterable[Atoms]
+        The atoms to write.
+
+    Returns
+    -------
+    int: The number of frames written.
+    """
+    directory = pathlib.Path(directory)
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True)
+
+    # (dtype, shape per atom or frame) of the columns
+    columns = {
+        "numbers": (int, ()),
+        **{key: PER_ATOM_COLUMNS[key] for key in ["positions", "forces"]},
+        **{key: PER_FRAME_COLUMNS[key] for key in ["cell", "pbc", "stress"]},
+        "energy": (float, ()),
+        "offsets": (int, ()),
+    }
+    n_frames, n_atoms, found = 0, 0, set()
+    # the frames are streamed to raw files, which get the '.npy' header at the end
+    with contextlib.ExitStack() as stack:
+        files = {
+            name: stack.enter_context(open(directory / f"{name}.raw", "wb"))
+            for name in columns
+        }
+        files["offsets"].write(np.zeros(1, dtype=int).tobytes())
+        for atom in atoms:
+            calc = atom.calc
+            results = {} if calc is None or calc.check_state(atom) else calc.results
+            stress = results.get("stress")
+            if stress is not None and np.shape(stress) == (3, 3):
+                stress = ase.stress.full_3x3_to_voigt_6_stress(stress)
+            n_atoms += len(atom)
+            values = {
+                "numbers": atom.numbers,
+                "positions": atom.positions,
+                "forces": results.get("forces"),
+                "cell": atom.cell.array,
+                "pbc": atom.pbc,
+                "stress": stress,
+                "energy": results.get("energy"),
+                "offsets": n_atoms,
+            }
+            for name, value in values.items():
+                dtype, shape = columns[name]
+                if value is None:
+                    shape = (len(atom), *shape) if name in PER_ATOM_COLUMNS else shape
+                    value = np.full(shape, np.nan)
+                else:
+                    found.add(name)
+                files[name].write(np.ascontiguousarray(value, dtype=dtype).tobytes())
+            n_frames += 1
+
+    for name, (dtype, shape) in columns.items():
+        raw = directory / f"{name}.raw"
+        if name in ["energy", "forces", "stress"] and name not in found:
+            raw.unlink()
+            continue
+        if name in PER_ATOM_COLUMNS:
+            shape = (n_atoms, *shape)
+        else:
+            shape = (n_frames + (name == "offsets"), *shape)
+        header = {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": shape,
+        }
+        with open(directory / f"{name}.npy", "wb") as file, open(raw, "rb") as data:
+            np.lib.format.write_array_header_1_0(file, header)
+            shutil.copyfileobj(data, file)
+        raw.unlink()
+    return n_frames
+
 
 class ZnAtoms(ZnTrackOption):
-    """Store list[ase.Atoms] in an ASE database."""
+    """Store list[ase.Atoms] in an ASE database.
+
+    With 'backend="npy"' the atoms are stored as memory-mappable '.npy' files
+    instead, see 'write_atoms_to_npy'. This is useful for large trajectories
+    with a fixed set of properties.
+    """
 
     dvc_option = "outs"
     zn_type = utils.ZnTypes.RESULTS
+    backends = ["db", "npy"]
+
+    def __init__(
+        self,
+        *args,
+        commit_interval: int = 1000,
+        backend: str = "db",
+        persistent: bool = False,
+        **kwargs,
+    ):
+        """Default __init__
+
+        Parameters
+        ----------
+        commit_interval: int, default = 1000
+            Number of atoms to insert into the database per transaction.
+        backend: str, default = "db"
+            Either "db" for an ASE SQLite database or "npy" for a directory of
+            memory-mappable '.npy' files.
+        persistent: bool, default = False
+            Do not let DVC remove the output before the Node is run, e.g. to append
+            to the database with 'get_writer(append=True)'.
+        """
+        if backend not in self.backends:
+            raise ValueError(f"Unknown backend '{backend}'. Use one of {self.backends}.")
+        super().__init__(*args, **kwargs)
+        self.commit_interval = commit_interval
+        self.backend = backend
+        if persistent:
+            # 'utils.DVCOptions.OUTS_PERSISTENT' is not a valid 'dvc stage add' option
+            self.dvc_option = "outs_persist"
 
     def get_filename(self, instance) -> pathlib.Path:
         """Overwrite filename to csv"""
+        if self.backend == "npy":
+            return pathlib.Path("nodes", instance.node_name, self.name)
         return pathlib.Path("nodes", instance.node_name, f"{self.name}.db")
 
+    def get_writer(
+        self,
+        instance,
+        background: bool = True,
+        append: bool = False,
+        metadata: dict = None,
+    ) -> AtomsWriter:
+        """Get an 'AtomsWriter' to stream atoms into the database while they are produced
+
+        Assign the writer to the attribute, so that 'save' closes it instead of
+        writing the atoms again. This avoids keeping all atoms in memory.
+        See 'AtomsWriter' for 'append' and 'metadata'.
+
+        Examples
+        --------
+        >>> class MyNode(Node):
+        >>>     outputs = ZnAtoms()
+        >>>
+        >>>     def run(self):
+        >>>         self.outputs = type(self).outputs.get_writer(self)
+        >>>         for atoms in simulation:
+        >>>             self.outputs.append(atoms)
+        """
+        if self.backend != "db":
+            raise ValueError(
+                f"Streaming is not supported by the '{self.backend}' backend."
+            )
+        return AtomsWriter(
+            self.get_filename(instance),
+            commit_interval=self.commit_interval,
+            append=append,
+            background=background,
+            metadata=metadata,
+            group=instance.node_name,
+        )
+
     def save(self, instance):
-        """Save value with ase.db.connect"""
+        """Save value with batched inserts into an ase.db
+
+        The value can be any iterable of atoms, e.g. a generator, which is consumed
+        while writing. An 'AtomsWriter' from 'get_writer' is closed.
+        """
         atoms: AtomsList = getattr(instance, self.name)
         file = self.get_filename(instance)
-        # file.parent.mkdir(exist_ok=True, parents=True)
-        with ase.db.connect(file, append=False) as db:
-            for atom in tqdm.tqdm(atoms, desc=f"Writing atoms to {file}"):
-                db.write(atom, group=instance.node_name)
+        if isinstance(atoms, AtomsWriter) and atoms.file == file:
+            atoms.close()
+            return
+        atoms = tqdm.tqdm(atoms, desc=f"Writing atoms to {file}")
+        if self.backend == "npy":
+            write_atoms_to_npy(file, atoms)
+        else:
+            write_atoms_to_db(
+                file,
+                atoms,
+                commit_interval=self.commit_interval,
+                group=instance.node_name,
+            )
 
     def get_data_from_files(self, instance) -> LazyAtomsSequence:
         """Load value with ase.db.connect"""
-        return LazyAtomsSequence(
-            database=self.get_filename(instance).resolve().as_posix()
+        file = self.get_filename(instance).resolve().as_posix()
+        if self.backend == "npy":
+            return ColumnarAtomsSequence(database=file)
+        return LazyAtomsSequence(database=file)
+
+
+def get_xyz_frame_offsets(
+    file: typing.Union[str, pathlib.Path],
+    max_frames: int = None,
+    offset: int = 0,
+    complete_lines: bool = False,
+) -> typing.List[int]:
+    """Scan a xyz or extxyz file for the byte offsets of its frames
+
+    Only the atom count lines are parsed, all other lines are skipped. A last frame
+    with missing lines, e.g. of a trajectory that is still being written, is ignored.
+
+    Parameters
+    ----------
+    file: str|Path
+        The xyz or extxyz file.
+    max_frames: int, default = None
+        Stop scanning after this number of frames.
+    offset: int, default = 0
+        Start scanning at this byte offset, which has to be the start of a frame.
+    complete_lines: bool, default = False
+        Also ignore a last frame whose last line does not end with a newline yet,
+        because it might still be written.
+
+    Returns
+    -------
+    list[int]:
+        The offsets of the n frames and the end of the last frame, so that the i-th
+        frame is 'offsets[i]:offsets[i + 1]'.
+    """
+    offsets = [offset]
+    with open(file, "rb") as data:
+        data.seek(offset)
+        while max_frames is None or len(offsets) <= max_frames:
+            line = data.readline()
+            if len(line.strip()) == 0:
+                break
+            lines = [data.readline() for _ in range(int(line) + 1)]
+            if len(lines[-1]) == 0 or (complete_lines and not lines[-1].endswith(b"\n")):
+                break
+            offsets.append(data.tell())
+    return offsets
+
+
+def _read_xyz_chunk(
+    file: typing.Union[str, pathlib.Path],
+    byte_ranges: typing.List[typing.Tuple[int, int]],
+    file_format: str,
+) -> AtomsList:
+    """Parse the frames in the given '(start, stop)' byte ranges"""
+    text = io.StringIO()
+    with open(file, "rb") as data:
+        for start, stop in byte_ranges:
+            data.seek(start)
+            text.write(data.read(stop - start).decode())
+    text.seek(0)
+    return ase.io.read(text, index=":", format=file_format)
+
+
+def _get_byte_ranges(
+    offsets: typing.Sequence[int], indices: typing.Sequence[int]
+) -> typing.List[typing.Tuple[int, int]]:
+    """Get the byte ranges of the frames, merging consecutive frames"""
+    byte_ranges = []
+    for idx in indices:
+        if len(byte_ranges) > 0 and byte_ranges[-1][1] == offsets[idx]:
+            byte_ranges[-1] = (byte_ranges[-1][0], offsets[idx + 1])
+        else:
+            byte_ranges.append((offsets[idx], offsets[idx + 1]))
+    return byte_ranges
+
+
+def iread_parallel(
+    file: typing.Union[str, pathlib.Path],
+    n_workers: int = None,
+    frames_per_chunk: int = 100,
+    max_frames: int = None,
+    indices: typing.Sequence[int] = None,
+    offsets: typing.Sequence[int] = None,
+) -> typing.Iterator[ase.Atoms]:
+    """Parse a xyz or extxyz file in parallel and yield the atoms in order
+
+    The file is scanned once for the offsets of the frames, see
+    'get_xyz_frame_offsets'. Chunks of 'frames_per_chunk' frames are then parsed in
+    a process pool. At most '2 * n_workers' chunks are parsed ahead of the consumer.
+    Frames that are not in 'indices' are never parsed.
+
+    Parameters
+    ----------
+    file: str|Path
+        The xyz or extxyz file.
+    n_workers: int, default = None
+        Number of processes, defaults to the number of CPUs. With a single worker,
+        the frames are parsed in this process.
+    frames_per_chunk: int, default = 100
+        Number of frames each worker parses at once.
+    max_frames: int, default = None
+        Only read the first frames of the file.
+    indices: list[int], default = None
+        Only read these frames, in the given order. Defaults to all frames.
+    offsets: list[int], default = None
+        The result of 'get_xyz_frame_offsets', if the file was already scanned.
+
+    Yields
+    ------
+    Atoms:
+        The atoms in the order of the file or of 'indices'.
+    """
+    file_format = ase.io.formats.filetype(os.fspath(file))
+    if file_format not in XYZ_FORMATS:
+        raise ValueError(f"Can only read {XYZ_FORMATS} in parallel, not '{file_format}'")
+    if offsets is None:
+        offsets = get_xyz_frame_offsets(file, max_frames)
+    if indices is None:
+        indices = range(len(offsets) - 1)
+    chunks = (
+        _get_byte_ranges(offsets, indices[start : start + frames_per_chunk])
+        for start in range(0, len(indices), frames_per_chunk)
+    )
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1:
+        for chunk in chunks:
+            yield from _read_xyz_chunk(file, chunk, file_format)
+        return
+    read_chunk = functools.partial(_read_xyz_chunk, file, file_format=file_format)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        loaded_chunks = iter_bounded(executor, read_chunk, chunks, 2 * n_workers)
+        with contextlib.closing(loaded_chunks):
+            for atoms in loaded_chunks:
+                yield from atoms
+
+
+def get_md5(
+    file: typing.Union[str, pathlib.Path], chunk_size: int = 2**20, n_bytes: int = None
+) -> str:
+    """Compute the md5 hash of a file in chunks of 'chunk_size' bytes
+
+    With 'n_bytes', only the first 'n_bytes' bytes of the file are hashed.
+    """
+    md5 = hashlib.md5()
+    remaining = float("inf") if n_bytes is None else n_bytes
+    with open(file, "rb") as data:
+        while remaining > 0:
+            chunk = data.read(int(min(chunk_size, remaining)))
+            if len(chunk) == 0:
+                break
+            md5.update(chunk)
+            remaining -= len(chunk)
+    return md5.hexdigest()
+
+
+def get_frame_offsets_index(
+    file: typing.Union[str, pathlib.Path],
+    index_file: typing.Union[str, pathlib.Path] = None,
+) -> np.ndarray:
+    """Get the frame offsets of a xyz or extxyz file from a persistent index
+
+    The offsets are computed once with 'get_xyz_frame_offsets' and saved with the
+    md5 hash, size and modification time of the file. The index is used as long as
+    the file has the same size and modification time or, e.g. after a 'dvc checkout',
+    the same hash. Otherwise, it is rebuilt.
+
+    Parameters
+    ----------
+    file: str|Path
+        The xyz or extxyz file.
+    index_file: str|Path, default = None
+        The '.npz' file for the index. Defaults to '<file>.offsets.npz'.
+
+    Returns
+    -------
+    np.ndarray:
+        The offsets of the n frames and the end of the last frame, so that the i-th
+        frame is 'offsets[i]:offsets[i + 1]'.
+    """
+    file = pathlib.Path(file)
+    file_format = ase.io.formats.filetype(os.fspath(file))
+    if file_format not in XYZ_FORMATS:
+        raise ValueError(f"Can only index {XYZ_FORMATS} files, not '{file_format}'")
+    index_file = pathlib.Path(index_file or f"{file}.offsets.npz")
+    stat = file.stat()
+
+    if index_file.exists():
+        with np.load(index_file) as index:
+            index = dict(index)
+        if index["size"] == stat.st_size:
+            if index["mtime_ns"] == stat.st_mtime_ns:
+                return index["offsets"]
+            if index["md5"] == get_md5(file):
+                index["mtime_ns"] = stat.st_mtime_ns
+                np.savez(index_file, **index)
+                return index["offsets"]
+        log.debug(f"Rebuilding the outdated frame index {index_file}")
+
+    index = {
+        "offsets": np.array(get_xyz_frame_offsets(file), dtype=np.int64),
+        "md5": get_md5(file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    try:
+        np.savez(index_file, **index)
+    except OSError as err:
+        log.warning(f"Could not save the frame index to {index_file}: {err}")
+    return index["offsets"]
+
+
+class TrajectorySequence(LazyAtomsSequence):
+    """LazyAtomsSequence that parses the frames of a xyz or extxyz file on access
+
+    The byte offsets of the frames are loaded from a persistent index, see
+    'get_frame_offsets_index'. The file is memory-mapped and only the requested
+    frames are parsed, so the trajectory does not have to be converted into a
+    database first.
+
+    Examples
+    --------
+    >>> sequence = TrajectorySequence("trajectory.extxyz")
+    >>> sample = sequence.view(None, None, 1000).tolist()
+    """
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.ContextManager[typing.Tuple[mmap.mmap, np.ndarray]]:
+        """Yield the memory-mapped file and the frame offsets"""
+        with self._lock:
+            if self._connection is None:
+                offsets = get_frame_offsets_index(self._database)
+                with open(self._database, "rb") as data:
+                    source = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+                self._connection = (source, offsets)
+            yield self._connection
+
+    def close(self):
+        """Close the memory map. It will be reopened on the next access."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection[0].close()
+            self._connection = None
+
+    def __len__(self):
+        if self._range is not None:
+            return len(self._range)
+        with self._connect() as (_, offsets):
+            return len(offsets) - 1
+
+    def _read_from_db(
+        self, indices: list, show_progress: bool = True
+    ) -> typing.Dict[int, ase.Atoms]:
+        """Parse the frames for the given indices from the memory-mapped file"""
+        db_indices = self._get_db_indices(indices)
+        file_format = ase.io.formats.filetype(os.fspath(self._database))
+        atoms = {}
+        with self._connect() as (source, offsets):
+            for db_idx, idx in sorted(db_indices.items()):
+                text = source[offsets[db_idx] : offsets[db_idx + 1]].decode()
+                atoms[idx] = ase.io.read(io.StringIO(text), format=file_format)
+        return atoms
+
+    def _read_columns(self, indices: typing.List[int], columns: typing.List[str]):
+        """Not available, because the file has no columns"""
+        raise NotImplementedError(
+            f"{self.__class__.__name__} can not read columns. Use the atoms instead."
         )
 
+    def get_array(
+        self, name: str, indices=None, ragged: bool = False, fill_value=np.nan
+    ) -> typing.Union[np.ndarray, typing.Tuple[np.ndarray, np.ndarray]]:
+        """Read an array for many atoms from the parsed frames
+
+        See 'LazyAtomsSequence.get_array'. The frames are parsed but not cached.
+        The arrays are taken from 'atoms.arrays' and the results of the calculator.
+        """
+        indices = self._get_indices(indices)
+        if name not in PER_ATOM_COLUMNS and name not in PER_FRAME_COLUMNS:
+            raise KeyError(
+                f"Can not read '{name}' from {self._database}. Use one of"
+                f" {list(PER_ATOM_COLUMNS) + list(PER_FRAME_COLUMNS)}."
+            )
+        frames = self._read_from_db(indices)
+        values = [self._get_frame_array(frames[idx], name) for idx in indices]
+        if name in PER_FRAME_COLUMNS:
+            dtype, shape = PER_FRAME_COLUMNS[name]
+            return stack_per_frame_arrays(values, dtype, shape, fill_value)
+        dtype, shape = PER_ATOM_COLUMNS[name]
+        natoms = [len(frames[idx]) for idx in indices]
+        return stack_per_atom_arrays(values, natoms, dtype, shape, ragged, fill_value)
+
+    @staticmethod
+    def _get_frame_array(atoms: ase.Atoms, name: str) -> typing.Optional[np.ndarray]:
+        """Get an array of 'PER_ATOM_COLUMNS' or 'PER_FRAME_COLUMNS' or None"""
+        if name == "cell":
+            return atoms.cell.array
+        if name == "pbc":
+            return atoms.pbc
+        value = atoms.arrays.get(name)
+        if value is None and atoms.calc is not None:
+            value = atoms.calc.results.get(name)
+        if name == "stress" and value is not None and np.shape(value) == (3, 3):
+            value = ase.stress.full_3x3_to_voigt_6_stress(value)
+        return value
+
+    def get_info(self, key: str, indices=None, default=np.nan) -> np.ndarray:
+        """Read a per-frame property from the parsed frames
+
+        See 'LazyAtomsSequence.get_info'. The frames are parsed but not cached.
+        Available are 'natoms', the results of the calculator, e.g. 'energy', and
+        the keys of 'atoms.info'.
+        """
+        indices = self._get_indices(indices)
+        frames = self._read_from_db(indices)
+        return self._get_frame_info([frames[idx] for idx in indices], key, default)
+
+    @staticmethod
+    def _get_frame_info(frames: AtomsList, key: str, default) -> np.ndarray:
+        """Get 'natoms', a result of the calculator or an info key of the frames"""
+        values = []
+        for atoms in frames:
+            if key == "natoms":
+                values.append(len(atoms))
+            elif atoms.calc is not None and key in atoms.calc.results:
+                values.append(atoms.calc.results[key])
+            else:
+                values.append(atoms.info.get(key))
+        return np.array([default if x is None else x for x in values])
+
+    def select(self, selection=None, **kwargs) -> "TrajectorySequence":
+        """Get a sub-sequence of the atoms that match a query on the parsed frames
+
+        See 'LazyAtomsSequence.select'. Keys are looked up as in 'get_info'. Every
+        frame of this sequence is parsed once, so use 'FileToASE' to convert the
+        file into a database if it is queried often.
+        """
+        keys, cmps = ase.db.core.parse_selection(selection, **kwargs)
+        index_range = self._get_range()
+        frames = self._read_from_db(list(range(len(self))), False)
+        frames = [frames[idx] for idx in range(len(self))]
+
+        def get_values(key: typing.Union[str, int]) -> np.ndarray:
+            if isinstance(key, int):
+                return np.array([np.sum(x.numbers == key) for x in frames])
+            return self._get_frame_info(frames, key, None)
+
+        mask = get_selection_mask(keys, cmps, get_values, len(index_range))
+        return self._get_sequence([idx for idx, x in zip(index_range, mask) if x])
+
 
 class FileToASE(Node):
     """Read an ASE compatible file and make it available as list of atoms objects
 
-    The atoms object is a LazyAtomsSequence
+    The atoms object is a LazyAtomsSequence. To only access a few frames of a large
+    xyz or extxyz file without converting it, use 'TrajectorySequence' instead.
+
+    Attributes
+    ----------
+    file: str|Path
+        Any file that can be read by 'ase.io.iread'.
+    frames_to_read: int, default = None
+        Maximum number of frames to read, i.e. the first frames of the selection.
+    start, stop, step: int, default = None
+        Select the frames 'start:stop:step' of the file.
+    n_samples: int, default = None
+        Randomly select this number of frames from 'start:stop:step'. The frames
+        are kept in the order of the file.
+    seed: int, default = 0
+        The seed for selecting 'n_samples' frames.
+    n_workers: int, default = None
+        Parse xyz and extxyz files with this number of processes, see
+        'iread_parallel'. Other file formats are always read serially.
+
+    For xyz and extxyz files, only the atom count lines of skipped frames are read.
+    Other formats are read with 'ase.io.iread', which parses all frames for
+    'n_samples'.
     """
 
     file: typing.Union[str, pathlib.Path] = dvc.deps()
     frames_to_read: int = zn.params(None)
+    start: int = zn.params(None)
+    stop: int = zn.params(None)
+    step: int = zn.params(None)
+    n_samples: int = zn.params(None)
+    seed: int = zn.params(0)
+    # does not change the atoms, therefore not a parameter
+    n_workers: int = meta.Text(None)
 
     atoms: AtomsList = ZnAtoms()
 
@@ -162,15 +2037,491 @@ class FileToASE(Node):
                     " file directly with GIT."
                 )
 
+    def get_frame_indices(self, n_frames: int) -> typing.Sequence[int]:
+        """Get the indices of the selected frames for a file with 'n_frames' frames"""
+        indices = range(n_frames)[self.start : self.stop : self.step]
+        if self.n_samples is not None:
+            rng = np.random.default_rng(self.seed)
+            samples = rng.choice(
+                len(indices), min(self.n_samples, len(indices)), replace=False
+            )
+            indices = [indices[x] for x in np.sort(samples)]
+        return indices[: self.frames_to_read]
+
+    def _get_max_frames(self) -> typing.Optional[int]:
+        """The number of frames at the head of the file that contain the selection"""
+        start, step = self.start or 0, self.step or 1
+        if start < 0 or step < 0 or (self.stop is not None and self.stop < 0):
+            return None
+        limits = [] if self.stop is None else [self.stop]
+        if self.frames_to_read is not None and self.n_samples is None:
+            limits.append(start + self.frames_to_read * step)
+        return min(limits, default=None)
+
+    def _iread_selection(self) -> typing.Iterator[ase.Atoms]:
+        """Read the selected frames with 'ase.io.iread'
+
+        Files of the 'RANDOM_ACCESS_FORMATS' are read with 'ase.io.Trajectory'
+        instead, so that only the sampled frames are read.
+        """
+        if self.n_samples is None:
+            frames = ase.io.iread(
+                self.file, index=slice(self.start, self.stop, self.step)
+            )
+            yield from itertools.islice(frames, self.frames_to_read)
+            return
+        if ase.io.formats.filetype(os.fspath(self.file)) in RANDOM_ACCESS_FORMATS:
+            with ase.io.Trajectory(self.file) as trajectory:
+                yield from (
+                    trajectory[x] for x in self.get_frame_indices(len(trajectory))
+                )
+            return
+        log.warning("Selecting 'n_samples' frames requires parsing the whole file.")
+        indices = self.get_frame_indices(sum(1 for _ in ase.io.iread(self.file)))
+        selected = set(indices)
+        atoms = {x: y for x, y in enumerate(ase.io.iread(self.file)) if x in selected}
+        yield from (atoms[x] for x in indices)
+
     def run(self):
-        self.atoms = []
-        for config, atom in enumerate(
-            tqdm.tqdm(ase.io.iread(self.file), desc="Reading File")
-        ):
-            if self.frames_to_read is not None:
-                if config >= self.frames_to_read:
-                    break
-            self.atoms.append(atom)
+        if ase.io.formats.filetype(os.fspath(self.file)) in XYZ_FORMATS:
+            offsets = get_xyz_frame_offsets(self.file, self._get_max_frames())
+            frames = iread_parallel(
+                self.file,
+                self.n_workers or 1,
+                indices=self.get_frame_indices(len(offsets) - 1),
+                offsets=offsets,
+            )
+        else:
+            if self.n_workers is not None and self.n_workers > 1:
+                log.warning(f"Can only read {XYZ_FORMATS} in parallel, reading serially.")
+            frames = self._iread_selection()
+        # a generator, so that the frames are written while the file is read
+        self.atoms = tqdm.tqdm(frames, desc="Reading File")
+
+
+class IncrementalFileToASE(FileToASE):
+    """FileToASE that only reads the frames appended to the file since the last run
+
+    The database is a persistent DVC output. Its metadata records the selection
+    parameters and the number of frames, the number of bytes and the md5 hash of
+    the part of the file that was read. If the file still starts with the same
+    bytes, only the new frames are parsed and appended to the database. Otherwise,
+    e.g. if the file or the selection changed or for formats other than xyz and
+    extxyz, the database is rebuilt. Selecting 'n_samples' or using negative
+    'start', 'stop' or 'step' always rebuilds the database. A last frame that does
+    not end with a newline yet is read by the next run.
+    """
+
+    atoms: AtomsList = ZnAtoms(persistent=True)
+
+    def _get_selection(self) -> dict:
+        return {
+            "frames_to_read": self.frames_to_read,
+            "start": self.start,
+            "stop": self.stop,
+            "step": self.step,
+            "n_samples": self.n_samples,
+            "seed": self.seed,
+        }
+
+    def _get_ingested(self, database: pathlib.Path) -> dict:
+        """Get the state of the last run, if the new frames can be appended to it"""
+        ingested = {"size": 0, "frames": 0, "rows": 0}
+        if self.n_samples is not None:
+            return ingested
+        if any(x is not None and x < 0 for x in [self.start, self.stop, self.step]):
+            return ingested
+        if not database.exists():
+            return ingested
+        last = ase.db.connect(database).metadata.get("ingested")
+        if last is None or last["selection"] != self._get_selection():
+            return ingested
+        if pathlib.Path(self.file).stat().st_size < last["size"]:
+            return ingested
+        if get_md5(self.file, n_bytes=last["size"]) != last["md5"]:
+            return ingested
+        return last
+
+    def run(self):
+        if ase.io.formats.filetype(os.fspath(self.file)) not in XYZ_FORMATS:
+            log.warning(f"Can only append {XYZ_FORMATS} files, rebuilding the database.")
+            super().run()
+            return
+
+        ingested = self._get_ingested(type(self).atoms.get_filename(self))
+        max_frames = self._get_max_frames()
+        if max_frames is not None:
+            max_frames = max(max_frames - ingested["frames"], 0)
+        offsets = get_xyz_frame_offsets(
+            self.file, max_frames, offset=ingested["size"], complete_lines=True
+        )
+        n_unread = pathlib.Path(self.file).stat().st_size - offsets[-1]
+        if max_frames is None and n_unread > 0:
+            log.warning(
+                f"Not reading the last {n_unread} bytes of {self.file}, because they"
+                " are no complete frame ending with a newline yet."
+            )
+        n_frames = ingested["frames"] + len(offsets) - 1
+        indices = self.get_frame_indices(n_frames)[ingested["rows"] :]
+        log.info(f"Reading {len(indices)} new frames from frame {ingested['frames']}.")
+
+        self.atoms = type(self).atoms.get_writer(
+            self,
+            append=ingested["size"] > 0,
+            metadata={
+                "ingested": {
+                    "selection": self._get_selection(),
+                    "size": offsets[-1],
+                    "md5": get_md5(self.file, n_bytes=offsets[-1]),
+                    "frames": n_frames,
+                    "rows": ingested["rows"] + len(indices),
+                }
+            },
+        )
+        frames = iread_parallel(
+            self.file,
+            self.n_workers or 1,
+            indices=[x - ingested["frames"] for x in indices],
+            offsets=offsets,
+        )
+        self.atoms.extend(tqdm.tqdm(frames, desc="Reading File"))
+
+
+def _select_rdf_atoms(
+    atoms: ase.Atoms, elements=None
+) -> typing.Tuple[ase.Atoms, typing.Optional[tuple]]:
+    """Select the atoms for 'get_rdf' like 'ase.geometry.analysis.Analysis.get_rdf'
+
+    Returns
+    -------
+    tuple[Atoms, tuple|None]:
+        The atoms that contribute to the RDF and the two atomic numbers of a partial
+        RDF, which 'Analysis.get_rdf' uses for a list of two integers.
+    """
+    if elements is None:
+        return atoms, None
+    if isinstance(elements, int):
+        return atoms[[elements]], None
+    if isinstance(elements, str):
+        return (
+            atoms[np.flatnonzero(np.array(atoms.get_chemical_symbols()) == elements)],
+            None,
+        )
+    if isinstance(elements, (list, tuple)):
+        if all(isinstance(x, int) for x in elements):
+            if len(elements) == 2:
+                return atoms, tuple(elements)
+            return atoms[list(elements)], None
+        if all(isinstance(x, str) for x in elements):
+            symbols = np.array(atoms.get_chemical_symbols())
+            return (
+                atoms[np.concatenate([np.flatnonzero(symbols == x) for x in elements])],
+                None,
+            )
+    raise ValueError(f"Unsupported type of elements '{elements}' for the RDF.")
+
+
+def get_rdf(atoms: ase.Atoms, rmax: float, nbins: int, elements=None) -> np.ndarray:
+    """Vectorized version of 'ase.geometry.analysis.Analysis.get_rdf' for one frame
+
+    Instead of the full distance matrix, only the pairs within 'rmax' are found with
+    the cell list of 'ase.neighborlist.primitive_neighbor_list' and histogrammed with
+    'np.bincount'. The cell must be at least '2 * rmax' wide in periodic directions,
+    so the neighbors are the minimum images. The bins and the normalization are the
+    same as in 'ase.geometry.rdf.get_rdf'.
+
+    Parameters
+    ----------
+    atoms: Atoms
+        The atoms to compute the RDF for.
+    rmax: float
+        Maximum distance of RDF.
+    nbins: int
+        Number of bins to divide RDF.
+    elements: str/int/list/tuple, default = None
+        Make partial RDFs, see 'RadialDistributionFunction'.
+
+    Returns
+    -------
+    np.ndarray:
+        The RDF of shape (nbins, ).
+    """
+    atoms, pair = _select_rdf_atoms(atoms, elements)
+    first, second, bins = _get_rdf_neighbor_bins(atoms, rmax, nbins)
+    volume, dr = atoms.cell.volume, float(rmax / nbins)
+    if pair is None:
+        mask = first < second
+        phi = len(atoms) / volume
+        norm = 2.0 * np.pi * dr * phi * len(atoms)
+    else:
+        numbers = atoms.numbers
+        mask = (numbers[first] == pair[0]) & (numbers[second] == pair[1])
+        phi = np.count_nonzero(numbers == pair[0]) / volume
+        norm = 4.0 * np.pi * dr * phi * len(atoms)
+
+    rdf = np.bincount(bins[mask], minlength=nbins + 1).astype(float)
+    return _normalize_rdf(rdf, norm, rmax, nbins)
+
+
+def _get_rdf_neighbor_bins(
+    atoms: ase.Atoms, rmax: float, nbins: int
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get all ordered pairs 'first, second' within 'rmax' and their RDF bins
+
+    The bin of a pair is 'ceil(distance / dr)' as in 'ase.geometry.rdf.get_rdf',
+    so bin 0 is for pairs at distance 0 and is not part of the RDF.
+    """
+    if atoms.cell.volume < 1.0e-10:
+        raise ase.geometry.rdf.VolumeNotDefined
+    ase.geometry.rdf.check_cell_and_r_max(atoms, rmax)
+    dr = float(rmax / nbins)
+
+    # the cutoff is slightly larger, because 'ase' includes pairs at exactly 'rmax'
+    first, second, distances = ase.neighborlist.primitive_neighbor_list(
+        "ijd", atoms.pbc, atoms.cell, atoms.positions, cutoff=rmax + dr / 2
+    )
+    bins = np.asarray(np.ceil(distances / dr), dtype=int)
+    mask = bins <= nbins
+    return first[mask], second[mask], bins[mask]
+
+
+def _normalize_rdf(counts: np.ndarray, norm: float, rmax: float, nbins: int):
+    """Normalize the pair counts of shape (..., nbins + 1) and drop bin 0"""
+    dr = float(rmax / nbins)
+    rr = np.arange(dr / 2, rmax, dr)
+    return counts[..., 1:] / (norm * (rr * rr + (dr * dr / 12)))
+
+
+def get_partial_rdfs(
+    atoms: ase.Atoms, rmax: float, nbins: int
+) -> typing.Dict[typing.Optional[typing.Tuple[int, int]], np.ndarray]:
+    """Compute the RDF and all partial RDFs of one frame with a single neighbor search
+
+    The pairs of all species are counted with a single 'np.bincount'.
+
+    Parameters
+    ----------
+    atoms: Atoms
+        The atoms to compute the RDFs for.
+    rmax: float
+        Maximum distance of RDF.
+    nbins: int
+        Number of bins to divide RDF.
+
+    Returns
+    -------
+    dict[tuple[int, int]|None, np.ndarray]:
+        The RDF of all atoms for the key None, which is the same as 'get_rdf(atoms)'
+        and for every pair of atomic numbers '(a, b)' with 'a <= b' of the species
+        in 'atoms' the same as 'get_rdf(atoms, elements=[a, b])'. All RDFs are of
+        shape (nbins, ).
+    """
+    first, second, bins = _get_rdf_neighbor_bins(atoms, rmax, nbins)
+    volume, dr, natoms = atoms.cell.volume, float(rmax / nbins), len(atoms)
+    species, species_indices = np.unique(atoms.numbers, return_inverse=True)
+    n_species = len(species)
+
+    pairs = species_indices[first] * n_species + species_indices[second]
+    counts = np.bincount(
+        pairs * (nbins + 1) + bins, minlength=n_species * n_species * (nbins + 1)
+    ).reshape((n_species, n_species, nbins + 1))
+
+    # every unordered pair is counted twice in the neighbor list
+    phi = natoms / volume
+    rdfs = {
+        None: _normalize_rdf(
+            (counts.sum(axis=(0, 1)) // 2).astype(float),
+            2.0 * np.pi * dr * phi * natoms,
+            rmax,
+            nbins,
+        )
+    }
+    species_counts = np.bincount(species_indices, minlength=n_species)
+    for idx, jdx in itertools.combinations_with_replacement(range(n_species), 2):
+        phi = species_counts[idx] / volume
+        rdfs[(species[idx], species[jdx])] = _normalize_rdf(
+            counts[idx, jdx].astype(float), 4.0 * np.pi * dr * phi * natoms, rmax, nbins
+        )
+    return rdfs
+
+
+def sum_rdf(
+    atoms: typing.Iterable[ase.Atoms], rmax: float, nbins: int, elements=None
+) -> typing.Tuple[np.ndarray, int]:
+    """Sum the RDFs of 'get_rdf' over frames without keeping the per-frame RDFs
+
+    Returns
+    -------
+    tuple[np.ndarray, int]:
+        The sum of the RDFs of shape (nbins, ) and the number of frames.
+    """
+    total = np.zeros(nbins)
+    n_frames = 0
+    for atom in atoms:
+        total += get_rdf(atom, rmax=rmax, nbins=nbins, elements=elements)
+        n_frames += 1
+    return total, n_frames
+
+
+def sum_partial_rdfs(
+    atoms: typing.Iterable[ase.Atoms], rmax: float, nbins: int
+) -> typing.Tuple[typing.Dict[str, np.ndarray], typing.Dict[str, int]]:
+    """Sum the RDFs of 'get_partial_rdfs' over frames
+
+    The full RDF is stored under the key "y" and the partial RDFs under the chemical
+    symbols of the pair, e.g. "H-O". A partial RDF is only summed over the frames
+    that contain both species.
+
+    Returns
+    -------
+    tuple[dict[str, np.ndarray], dict[str, int]]:
+        The sums of the RDFs of shape (nbins, ) and the number of frames per key.
+    """
+    totals, n_frames = {}, collections.Counter()
+    for atom in atoms:
+        for pair, rdf in get_partial_rdfs(atom, rmax=rmax, nbins=nbins).items():
+            key = (
+                "y"
+                if pair is None
+                else "-".join(ase.data.chemical_symbols[x] for x in pair)
+            )
+            totals[key] = totals.get(key, 0) + rdf
+            n_frames[key] += 1
+    return totals, dict(n_frames)
+
+
+def iter_rdf_blocks(
+    atoms: typing.Iterable[ase.Atoms],
+    rmax: float,
+    nbins: int,
+    elements=None,
+    block_size: int = 100,
+    n_workers: int = 1,
+    all_pairs: bool = False,
+) -> typing.Iterator[tuple]:
+    """Yield the RDF sums of consecutive blocks of 'block_size' frames in order
+
+    With 'n_workers > 1' the blocks are computed in a process pool. A
+    'LazyAtomsSequence' is split into data-free views, so every worker reads its
+    frames from the database on its own. At most '2 * n_workers' blocks are
+    submitted at once, so the memory does not depend on the number of frames.
+    Pending blocks are cancelled when the iterator is closed early.
+
+    Parameters
+    ----------
+    atoms: Iterable[Atoms]|LazyAtomsSequence
+        The frames. Must be a sequence for 'n_workers > 1'.
+    rmax, nbins, elements:
+        See 'get_rdf'.
+    block_size: int, default = 100
+        Number of frames per block.
+    n_workers: int, default = 1
+        Number of processes, None for the number of CPUs.
+    all_pairs: bool, default = False
+        Use 'sum_partial_rdfs' instead of 'sum_rdf' and ignore 'elements'.
+
+    Yields
+    ------
+    tuple[np.ndarray, int]|tuple[dict[str, np.ndarray], dict[str, int]]:
+        The result of 'sum_rdf' or 'sum_partial_rdfs' for every block.
+    """
+    if all_pairs:
+        task = functools.partial(sum_partial_rdfs, rmax=rmax, nbins=nbins)
+    else:
+        task = functools.partial(sum_rdf, rmax=rmax, nbins=nbins, elements=elements)
+
+    if isinstance(atoms, LazyAtomsSequence):
+        blocks = (
+            atoms.view(start, start + block_size)
+            for start in range(0, len(atoms), block_size)
+        )
+    elif isinstance(atoms, collections.abc.Sequence):
+        blocks = (
+            atoms[start : start + block_size]
+            for start in range(0, len(atoms), block_size)
+        )
+    else:
+        iterator = iter(atoms)
+        blocks = iter(lambda: list(itertools.islice(iterator, block_size)), [])
+
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1:
+        yield from map(task, blocks)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = iter_bounded(executor, task, blocks, 2 * n_workers)
+        with contextlib.closing(results):
+            yield from results
+
+
+def sum_rdf_parallel(
+    atoms: typing.Sequence[ase.Atoms],
+    rmax: float,
+    nbins: int,
+    elements=None,
+    n_workers: int = None,
+    chunk_size: int = 100,
+    all_pairs: bool = False,
+):
+    """Shard 'sum_rdf' over chunks of frames in a process pool
+
+    Parameters
+    ----------
+    atoms: list[Atoms]|LazyAtomsSequence
+        The frames.
+    rmax, nbins, elements:
+        See 'get_rdf'.
+    n_workers: int, default = None
+        Number of processes, defaults to the number of CPUs.
+    chunk_size: int, default = 100
+        Number of frames per task.
+    all_pairs: bool, default = False
+        Use 'sum_partial_rdfs' instead of 'sum_rdf' and ignore 'elements'.
+
+    Returns
+    -------
+    tuple[np.ndarray, int]|tuple[dict[str, np.ndarray], dict[str, int]]:
+        The result of 'sum_rdf' or 'sum_partial_rdfs' for all frames.
+    """
+    if all_pairs:
+        total, n_frames = {}, collections.Counter()
+    else:
+        total, n_frames = np.zeros(nbins), 0
+    for chunk_total, chunk_frames in iter_rdf_blocks(
+        atoms,
+        rmax=rmax,
+        nbins=nbins,
+        elements=elements,
+        block_size=chunk_size,
+        n_workers=n_workers,
+        all_pairs=all_pairs,
+    ):
+        if all_pairs:
+            for key, value in chunk_total.items():
+                total[key] = total.get(key, 0) + value
+            n_frames.update(chunk_frames)
+        else:
+            total += chunk_total
+            n_frames += chunk_frames
+    if all_pairs:
+        return total, dict(n_frames)
+    return total, n_frames
+
+
+def get_block_stderr(block_means: typing.Sequence[np.ndarray]) -> np.ndarray:
+    """Standard error of the mean from the means of independent blocks
+
+    Returns
+    -------
+    np.ndarray:
+        'std(block_means, ddof=1) / sqrt(n_blocks)' per bin, NaN for less than two
+        blocks.
+    """
+    block_means = np.asarray(block_means)
+    if len(block_means) < 2:
+        return np.full(block_means.shape[1:], np.nan)
+    return np.std(block_means, axis=0, ddof=1) / np.sqrt(len(block_means))
 
 
 class RadialDistributionFunction(Node):
@@ -188,21 +2539,271 @@ class RadialDistributionFunction(Node):
             elements is an *integer* or a *list/tuple of integers*, only those atoms will
             contribute to the RDF (like a mask). If elements is a *string* or a
             *list/tuple of strings*, only Atoms of those elements will contribute.
+    all_pairs: bool, default = False
+            Compute the full RDF and the partial RDFs of all pairs of species in a
+            single neighbor search per frame with 'get_partial_rdfs'. The partial
+            RDFs are additional columns of 'plot', e.g. "H-O". Requires the "numpy"
+            engine and cannot be combined with 'elements'.
+    engine: str, default = "ase"
+            Either "ase" for 'ase.geometry.analysis.Analysis' or "numpy" for the
+            vectorized 'get_rdf', which streams the frames and does not compute the
+            full distance matrix. Both give identical results. 'all_pairs' and
+            'tolerance' require the "numpy" engine.
+    n_workers: int, default = None
+            Distribute the blocks over this number of processes with the "numpy"
+            engine, see 'iter_rdf_blocks'.
+    block_size: int, default = 100
+            Number of consecutive frames per block. The standard error of the RDF
+            is estimated from the spread of the block averages.
+    tolerance: float, default = None
+            Stop reading frames once the standard error of every bin is below this
+            value, but not before 'min_blocks' blocks. This changes the result, as
+            only the frames read until then are averaged. Requires the "numpy" engine.
+    plot: pd.DataFrame
+            The RDF averaged over all frames that were read.
+    stderr: pd.DataFrame
+            The standard error of the columns of 'plot' from the block averages.
     """
 
     rmax: float = zn.params()
     nbins: int = zn.params()
     elements: str = zn.params(None)
+    all_pairs: bool = zn.params(False)
+    block_size: int = zn.params(100)
+    tolerance: float = zn.params(None)
+    # does not change the result, therefore not a parameter
+    engine: str = meta.Text("ase")
+    n_workers: int = meta.Text(None)
 
     plot: pd.DataFrame = zn.plots(x="x", x_label=r"distance r", y_label=r"RDF g(r)")
+    stderr: pd.DataFrame = zn.plots(
+        x="x", x_label=r"distance r", y_label=r"standard error of g(r)"
+    )
 
     data: AtomsList = zn.deps()
 
+    engines = ["ase", "numpy"]
+    min_blocks: int = 5
+
     def run(self):
-        analysis = ase.geometry.analysis.Analysis(list(self.data))
-        data = analysis.get_rdf(rmax=self.rmax, nbins=self.nbins, elements=self.elements)
+        if self.engine not in self.engines:
+            raise ValueError(
+                f"Unknown engine '{self.engine}'. Use one of {self.engines}."
+            )
+        if self.all_pairs and (self.engine != "numpy" or self.elements is not None):
+            raise ValueError("'all_pairs' requires the 'numpy' engine and no 'elements'.")
+        if self.tolerance is not None and self.engine != "numpy":
+            raise ValueError("'tolerance' requires the 'numpy' engine.")
+        if self.engine == "numpy":
+            rdf, block_means = self._run_numpy()
+        else:
+            if self.n_workers is not None:
+                log.warning("'n_workers' is only used by the 'numpy' engine.")
+            analysis = ase.geometry.analysis.Analysis(list(self.data))
+            data = np.array(
+                analysis.get_rdf(rmax=self.rmax, nbins=self.nbins, elements=self.elements)
+            )
+            rdf = {"y": np.mean(data, axis=0)}
+            block_means = {
+                "y": [
+                    np.mean(data[start : start + self.block_size], axis=0)
+                    for start in range(0, len(data), self.block_size)
+                ]
+            }
 
-        self.plot = pd.DataFrame(
-            {"x": np.linspace(0, self.rmax, self.nbins), "y": np.mean(data, axis=0)}
+        x = np.linspace(0, self.rmax, self.nbins)
+        self.stderr = pd.DataFrame(
+            {"x": x, **{key: get_block_stderr(block_means[key]) for key in rdf}}
         )
+        self.stderr.set_index("x")
+        self.plot = pd.DataFrame({"x": x, **rdf})
         self.plot.set_index("x")
+
+    def _run_numpy(self) -> typing.Tuple[dict, dict]:
+        """Stream the blocks of frames until all frames are read or converged
+
+        Returns
+        -------
+        tuple[dict[str, np.ndarray], dict[str, list[np.ndarray]]]:
+            The RDFs and the block averages per column of 'plot'.
+        """
+        total, n_frames = {}, collections.Counter()
+        block_means = collections.defaultdict(list)
+        blocks = iter_rdf_blocks(
+            self.data,
+            rmax=self.rmax,
+            nbins=self.nbins,
+            elements=self.elements,
+            block_size=self.block_size,
+            n_workers=self.n_workers if self.n_workers is not None else 1,
+            all_pairs=self.all_pairs,
+        )
+        with contextlib.closing(blocks):
+            for block_total, block_frames in blocks:
+                if not self.all_pairs:
+                    block_total, block_frames = {"y": block_total}, {"y": block_frames}
+                for key, value in block_total.items():
+                    total[key] = total.get(key, 0) + value
+                    block_means[key].append(value / block_frames[key])
+                n_frames.update(block_frames)
+
+                if self.tolerance is not None and all(
+                    len(means) >= self.min_blocks
+                    and np.max(get_block_stderr(means)) < self.tolerance
+                    for means in block_means.values()
+                ):
+                    log.info(f"RDF converged after {max(n_frames.values())} frames.")
+                    break
+        return {key: value / n_frames[key] for key, value in total.items()}, block_means
+
+
+def iter_unwrapped_positions(
+    atoms: typing.Iterable[ase.Atoms], indices: typing.Sequence[int] = None
+) -> typing.Iterator[np.ndarray]:
+    """Yield the positions of consecutive frames unwrapped across periodic boundaries
+
+    Every displacement between two frames is wrapped to the minimum image along the
+    periodic directions of the current cell, so only one frame is kept in memory.
+    Atoms must not move more than half a box length between two frames.
+
+    Parameters
+    ----------
+    atoms: Iterable[Atoms]
+        The frames of the trajectory.
+    indices: list[int], default = None
+        Only unwrap these atoms, defaults to all atoms.
+
+    Yields
+    ------
+    np.ndarray:
+        The unwrapped positions of shape (n_atoms, 3) in the frame of the first atoms.
+    """
+    unwrapped, scaled = None, None
+    for atom in atoms:
+        if indices is not None:
+            atom = atom[indices]
+        if unwrapped is None:
+            unwrapped = atom.get_positions()
+        else:
+            delta = atom.get_scaled_positions(wrap=False) - scaled
+            delta[:, atom.pbc] -= np.round(delta[:, atom.pbc])
+            unwrapped = unwrapped + delta @ atom.cell.array
+        scaled = atom.get_scaled_positions(wrap=False)
+        yield unwrapped
+
+
+def sum_msd_fft(positions: np.ndarray) -> np.ndarray:
+    """Sum of the mean squared displacements of atoms with the FFT algorithm
+
+    Computes 'msd(m) = <|r(t + m) - r(t)|^2>_t' for all lags 'm' in O(N log N) for
+    N frames as 'S1(m) - 2 S2(m)', where 'S2' is the autocorrelation of the positions
+    by FFT and 'S1' follows from the squared positions by a recursion, see
+    V. Calandrini et al., Collection SFN 12, 201-232 (2011).
+
+    Parameters
+    ----------
+    positions: np.ndarray
+        The unwrapped positions of shape (n_frames, n_atoms, 3).
+
+    Returns
+    -------
+    np.ndarray:
+        The MSD of shape (n_frames, ) summed over all atoms.
+    """
+    n_frames = len(positions)
+    lags = n_frames - np.arange(n_frames)
+
+    # S2: the autocorrelation of the zero-padded signal, summed over atoms and axes
+    spectrum = np.fft.rfft(positions, n=2 * n_frames, axis=0)
+    power = np.sum(
+        spectrum.real**2 + spectrum.imag**2, axis=tuple(range(1, spectrum.ndim))
+    )
+    s2 = np.fft.irfft(power, n=2 * n_frames)[:n_frames] / lags
+
+    # S1: sum of |r(t)|^2 + |r(t + m)|^2 over all valid t
+    squared = np.sum(positions**2, axis=tuple(range(1, positions.ndim)))
+    removed = np.concatenate(
+        [[0.0], np.cumsum(squared[:-1]) + np.cumsum(squared[::-1][:-1])]
+    )
+    s1 = (2 * np.sum(squared) - removed) / lags
+    return s1 - 2 * s2
+
+
+class MeanSquaredDisplacement(Node):
+    """Compute the mean squared displacement (MSD) from a list of ase.Atoms
+
+    The frames are read once and unwrapped on the fly into a temporary memory-mapped
+    file. The MSD is then computed with 'sum_msd_fft' for chunks of
+    'atoms_per_chunk' atoms, so the memory does not depend on the number of atoms.
+
+    Attributes
+    ----------
+    elements: str/list, default = None
+            Only atoms of these chemical symbols contribute to the MSD. If elements is
+            *None*, all atoms are used.
+    timestep: float, default = 1.0
+            The time between two frames.
+    fit_range: list, default = [0.1, 0.5]
+            The diffusion coefficient 'slope / 6' is fitted to the MSD between these
+            fractions of the longest lag time. Large lags are averaged over only a few
+            time origins and are therefore excluded.
+    plot: pd.DataFrame
+            The MSD over the lag time "t".
+    diffusion: dict
+            The fitted self-diffusion coefficient.
+    """
+
+    elements: str = zn.params(None)
+    timestep: float = zn.params(1.0)
+    fit_range: list = zn.params([0.1, 0.5])
+
+    plot: pd.DataFrame = zn.plots(x="t", x_label=r"time t", y_label=r"MSD")
+    diffusion: dict = zn.metrics()
+
+    data: AtomsList = zn.deps()
+
+    atoms_per_chunk: int = 1000
+
+    def get_atom_indices(self, atoms: ase.Atoms) -> typing.Optional[np.ndarray]:
+        """Indices of the atoms that contribute to the MSD"""
+        if self.elements is None:
+            return None
+        elements = [self.elements] if isinstance(self.elements, str) else self.elements
+        return np.flatnonzero(np.isin(atoms.get_chemical_symbols(), elements))
+
+    def run(self):
+        n_frames = len(self.data)
+        indices = self.get_atom_indices(self.data[0])
+        n_atoms = len(self.data[0]) if indices is None else len(indices)
+        if n_frames < 2 or n_atoms == 0:
+            raise ValueError("The MSD requires at least two frames and one atom.")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            positions = np.lib.format.open_memmap(
+                pathlib.Path(tmp_dir, "positions.npy"),
+                mode="w+",
+                shape=(n_frames, n_atoms, 3),
+            )
+            for frame, unwrapped in enumerate(
+                iter_unwrapped_positions(tqdm.tqdm(self.data), indices)
+            ):
+                positions[frame] = unwrapped
+
+            total = np.zeros(n_frames)
+            for start in range(0, n_atoms, self.atoms_per_chunk):
+                total += sum_msd_fft(positions[:, start : start + self.atoms_per_chunk])
+            del positions
+        msd = total / n_atoms
+
+        time = np.arange(n_frames) * self.timestep
+        fit = slice(
+            int(self.fit_range[0] * (n_frames - 1)),
+            int(self.fit_range[1] * (n_frames - 1)) + 1,
+        )
+        if fit.stop - fit.start < 2:
+            fit = slice(0, n_frames)
+        slope = np.polyfit(time[fit], msd[fit], 1)[0]
+
+        self.diffusion = {"diffusion_coefficient": float(slope / 6)}
+        self.plot = pd.DataFrame({"t": time, "msd": msd})
+        self.plot.set_index("t")
@@ -1,19 +1,266 @@
+import collections
+import concurrent.futures
 import contextlib
+import hashlib
+import io
+import itertools
+import json
+import logging
 import pathlib
+import queue
+import re
 import shutil
+import sqlite3
+import threading
+import time
+import typing
 
 import ase.calculators.cp2k
+import ase.calculators.singlepoint
+import ase.db
+import numpy as np
+import pandas as pd
 import yaml
 from cp2k_input_tools.generator import CP2KInputGenerator
 from zntrack import Node, dvc, meta, utils, zn
 
-from znlib.atomistic.ase import AtomsList, ZnAtoms
+from znlib.atomistic.ase import (
+    AtomsList,
+    LazyAtomsSequence,
+    ZnAtoms,
+    get_md5,
+    iter_bounded,
+)
+
+log = logging.getLogger(__name__)
+
+SCF_CONVERGED = re.compile(r"SCF run converged in\s+(\d+) steps")
+SCF_NOT_CONVERGED = re.compile(r"SCF run NOT converged")
+
+
+def parse_scf_convergence(text: str) -> typing.Tuple[float, typing.Optional[bool]]:
+    """Parse the last SCF run from the CP2K output 'text'
+
+    Returns
+    -------
+    tuple[float, bool|None]:
+        The number of SCF iterations, NaN if unknown, and whether the SCF converged,
+        None if the output does not contain an SCF run.
+    """
+    converged = list(SCF_CONVERGED.finditer(text))
+    not_converged = list(SCF_NOT_CONVERGED.finditer(text))
+    if len(converged) == 0 and len(not_converged) == 0:
+        return np.nan, None
+    if len(not_converged) > 0 and (
+        len(converged) == 0 or not_converged[-1].start() > converged[-1].start()
+    ):
+        return np.nan, False
+    return float(converged[-1].group(1)), True
+
+
+def _get_process_tree(pid: int) -> typing.List[int]:
+    """The pid and the pids of all its descendants from '/proc'"""
+    children = collections.defaultdict(list)
+    for stat in pathlib.Path("/proc").glob("[0-9]*/stat"):
+        with contextlib.suppress(OSError, ValueError, IndexError):
+            # the process name in parentheses can contain spaces
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+            children[int(fields[1])].append(int(stat.parent.name))
+
+    pids, tree = [pid], []
+    while len(pids) > 0:
+        pid = pids.pop()
+        pids += children[pid]
+        tree.append(pid)
+    return tree
+
+
+def get_peak_rss(pid: int) -> float:
+    """The summed peak resident set size of a process and its children in MB
+
+    Reads 'VmHWM' from '/proc', e.g. for the 'cp2k_shell' and its MPI ranks. This is
+    the peak since the process started or since the last 'reset_peak_rss'.
+    Returns NaN if '/proc' is not available.
+    """
+    peak_rss = 0.0
+    for pid in _get_process_tree(pid):
+        with contextlib.suppress(OSError):
+            for line in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    peak_rss += int(line.split()[1]) / 1024
+    return peak_rss if peak_rss > 0 else np.nan
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """Reset the peak resident set size of a process and its children
+
+    Writes "5" to '/proc/<pid>/clear_refs', so that 'get_peak_rss' starts again
+    from the current resident set size. Returns False if this is not possible for
+    all processes, e.g. without permission or before Linux 4.0.
+    """
+    reset = True
+    for pid in _get_process_tree(pid):
+        try:
+            pathlib.Path(f"/proc/{pid}/clear_refs").write_text("5")
+        except OSError:
+            reset = False
+    return reset
+
+
+class CP2KCache:
+    """Content-addressed on-disk store for the results of single point calculations
+
+    The results are stored in an SQLite database in 'directory' under a hash of the
+    atoms, the CP2K input and the referenced files, see 'get_key'. The cache can be
+    shared by threads, processes and different repositories. If the stored results
+    exceed 'max_bytes', the least recently used results are evicted.
+
+    Attributes
+    ----------
+    hits, misses, evictions: int
+        Statistics of this instance.
+    """
+
+    def __init__(self, directory: typing.Union[str, pathlib.Path], max_bytes: int):
+        """Default __init__
+
+        Parameters
+        ----------
+        directory: str|Path
+            The directory of the cache, which is created if necessary.
+        max_bytes: int
+            The maximum size of the stored results in bytes.
+        """
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.directory / "cp2k_cache.sqlite", timeout=60, check_same_thread=False
+        )
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB"
+                " NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS atime_index ON results(atime)"
+            )
+
+    def __enter__(self) -> "CP2KCache":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def get_key(
+        atoms: ase.Atoms, script: str, dependencies: typing.Iterable[str] = ()
+    ) -> str:
+        """The sha256 of the positions, numbers, cell, pbc and the CP2K input
+
+        Parameters
+        ----------
+        atoms: ase.Atoms
+            The frame to compute.
+        script: str
+            The CP2K input as sent to CP2K, without the coordinates and the cell.
+        dependencies: list[str], default = ()
+            The md5 hashes of the files used by the input, e.g. the basis set. Only
+            the contents are hashed, so the cache can be shared between directories.
+        """
+        key = hashlib.sha256(script.encode())
+        for md5 in dependencies:
+            key.update(md5.encode())
+        for array, dtype in [
+            (atoms.positions, np.float64),
+            (atoms.numbers, np.int64),
+            (atoms.cell.array, np.float64),
+            (atoms.pbc, np.bool_),
+        ]:
+            key.update(np.ascontiguousarray(array, dtype=dtype).tobytes())
+        return key.hexdigest()
+
+    def get(self, key: str) -> typing.Optional[dict]:
+        """The stored results for 'key' or None"""
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE results SET atime = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+        with np.load(io.BytesIO(row[0]), allow_pickle=False) as data:
+            return {
+                name: value.item() if value.ndim == 0 else value
+                for name, value in data.items()
+            }
+
+    def put(self, key: str, results: dict):
+        """Store the results, e.g. 'calculator.results', and evict old results"""
+        buffer = io.BytesIO()
+        np.savez(buffer, **{name: np.asarray(value) for name, value in results.items()})
+        value = buffer.getvalue()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            (size,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            if size > self.max_bytes:
+                evicted = []
+                for old_key, old_size in self._connection.execute(
+                    "SELECT key, size FROM results ORDER BY atime"
+                ).fetchall():
+                    if size <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    size -= old_size
+                self._connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+                self.evictions += len(evicted)
+
+    def info(self) -> dict:
+        """The statistics of this instance and the size of the cache"""
+        with self._lock:
+            n_entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests > 0 else 0.0,
+            "evictions": self.evictions,
+            "entries": n_entries,
+            "size_bytes": size,
+        }
+
+    def close(self):
+        self._connection.close()
 
 
 class CP2KNode(Node):
     """CP2K Node
 
-    This Node allows you to perform single point calculation using CP2K
+    This Node allows you to perform single point calculation using CP2K.
+    All frames are computed in a single 'cp2k_shell' session, which only receives
+    the new positions and cell of every frame. The session is restarted if the
+    periodicity changes or the calculation fails. With 'n_workers > 1' the frames
+    are distributed over independent sessions, each with its own scratch directory
+    in 'cp2k_output_dir'.
+
+    Every frame is committed to 'outputs' as soon as it is computed. The database
+    is not removed by DVC, so an interrupted run resumes after the last frame that
+    matches 'atoms', if the inputs of the calculation did not change, see
+    'get_fingerprint'.
 
     Parameters
     ----------
@@ -30,6 +277,35 @@ class CP2KNode(Node):
         Typically, this would be 'CP2KNode().wfn_restart_file' from another Node.
         But it can also be another CP2K wavefunction restart file. Make sure to use
         'scf_guess: restart' to make use of it.
+    cp2k_shell: str
+        The command to start the 'cp2k_shell'. The placeholder '{worker}' is replaced
+        by the index of the worker, e.g. to pin workers to different cores.
+    n_workers: int, default = 1
+        Number of 'cp2k_shell' sessions to run side by side. The outputs are written
+        in the order of 'atoms'.
+    wfn_chaining: bool, default = False
+        Start the SCF of every frame from the converged wavefunction of the previous
+        frame with 'scf_guess: restart'. A running session keeps the wavefunction
+        in memory and a new session reads 'cp2k-RESTART.wfn' from the scratch
+        directory. The restart file is removed before a frame with a different
+        composition and before retrying a failed frame, so CP2K falls back to the
+        'atomic' guess. A frame that started from a previous wavefunction and whose
+        SCF did not converge according to 'cp2k.out' is computed again in a new
+        session from the 'atomic' guess. With 'n_workers > 1' every worker chains
+        its own frames.
+    cache_dir: str, default = None
+        Opt in to look up and store the results in a 'CP2KCache' in this directory,
+        which can be shared by all nodes, e.g. "~/.cache/znlib/cp2k".
+    cache_max_bytes: int, default = 2**30
+        The maximum size of the cache.
+    cache_info: dict
+        The cache statistics of the last run, see 'CP2KCache.info'.
+    telemetry: pd.DataFrame
+        Per frame of the last run: the wall time, the SCF iterations and convergence
+        parsed from 'cp2k.out', the peak RSS of the 'cp2k_shell' process tree in MB
+        during the frame, the worker and whether the results were cached. If the
+        peak can not be reset, see 'reset_peak_rss', it is the peak since the
+        session started.
 
     References
     ----------
@@ -44,15 +320,26 @@ class CP2KNode(Node):
     input_file: str = dvc.params()
     # e.g. "env OMP_NUM_THREADS=2 mpiexec -np 4 cp2k_shell.psmp"
     cp2k_shell: str = meta.Text("cp2k_shell.psmp")
+    n_workers: int = meta.Text(1)
+    cache_dir: str = meta.Text(None)
+    cache_max_bytes: int = meta.Text(2**30)
 
-    outputs: AtomsList = ZnAtoms()
+    # commit every frame, so an interrupted run can be resumed
+    outputs: AtomsList = ZnAtoms(persistent=True, commit_interval=1)
 
     cp2k_output_dir: pathlib.Path = dvc.outs(utils.nwd / "cp2k")
+    cache_info: dict = zn.metrics()
+    telemetry: pd.DataFrame = zn.plots(
+        x="frame", y="wall_time", x_label="frame", y_label="wall time / s"
+    )
 
     dependencies = dvc.deps(None)
     wfn_restart = dvc.deps(None)
+    wfn_chaining: bool = zn.params(False)
 
     stress_tensor: bool = True
+    # how often a failed frame is retried in a new 'cp2k_shell' session
+    max_restarts: int = 1
 
     @staticmethod
     def _remove_unwanted_entries(data):
@@ -68,10 +355,37 @@ class CP2KNode(Node):
 
         return data
 
-    def get_calculator(self, script) -> ase.calculators.cp2k.CP2K:
+    @staticmethod
+    def _set_scf_guess(data: dict, scf_guess: str) -> dict:
+        """Set 'force_eval/dft/scf/scf_guess' of the 'input_file' in any case"""
+        section = data
+        for name in ["force_eval", "dft", "scf"]:
+            keys = [key for key in section if key.lower() == name] or [name]
+            section = section.setdefault(keys[0], {})
+        for key in [key for key in section if key.lower() == "scf_guess"]:
+            del section[key]
+        section["scf_guess"] = scf_guess
+        return data
+
+    @staticmethod
+    def _has_wfn_restart(label: str) -> bool:
+        """Whether a wavefunction restart file of the CP2K project 'label' exists"""
+        label = pathlib.Path(label)
+        return any(label.parent.glob(f"{label.name}-RESTART.wfn*"))
+
+    @staticmethod
+    def _remove_wfn_restart(label: str):
+        """Remove the wavefunction restart files of the CP2K project 'label'"""
+        label = pathlib.Path(label)
+        for file in label.parent.glob(f"{label.name}-RESTART.wfn*"):
+            file.unlink()
+
+    def get_calculator(
+        self, script, label: str = "cp2k", command: str = None
+    ) -> ase.calculators.cp2k.CP2K:
         """Get an ASE CP2K calculator."""
         return ase.calculators.cp2k.CP2K(
-            command=self.cp2k_shell,
+            command=command or self.cp2k_shell,
             inp=script,
             basis_set=None,
             basis_set_file=None,
@@ -84,20 +398,331 @@ class CP2KNode(Node):
             stress_tensor=self.stress_tensor,
             xc=None,
             print_level=None,
-            label="cp2k",
+            label=label,
+        )
+
+    @staticmethod
+    def _close_calculator(calculator: ase.calculators.cp2k.CP2K):
+        """Terminate the 'cp2k_shell', even if it is not responding anymore"""
+        with contextlib.suppress(Exception):
+            calculator.close()
+
+    def compute(
+        self,
+        atom: ase.Atoms,
+        script: str,
+        calculator=None,
+        label: str = "cp2k",
+        command: str = None,
+    ):
+        """Compute a single frame, reusing the 'cp2k_shell' of 'calculator'
+
+        ASE only sends the changed positions and cell to a running 'cp2k_shell' and
+        reloads the input for a different composition. The periodicity is part of
+        the input, but not updated by ASE, so a new session is started for it.
+
+        Parameters
+        ----------
+        atom: ase.Atoms
+            The frame to compute. The results are attached as a
+            'SinglePointCalculator', so they are independent of the session.
+        script: str
+            The CP2K input script.
+        calculator: ase.calculators.cp2k.CP2K, default = None
+            The calculator of the previous frame.
+        label, command:
+            Passed to 'get_calculator' for a new session.
+
+        Returns
+        -------
+        ase.calculators.cp2k.CP2K:
+            The calculator to use for the next frame.
+        """
+        if (
+            calculator is not None
+            and calculator.atoms is not None
+            and not np.array_equal(calculator.atoms.pbc, atom.pbc)
+        ):
+            self._close_calculator(calculator)
+            calculator = None
+
+        for restart in range(self.max_restarts + 1):
+            if calculator is None:
+                calculator = self.get_calculator(script, label=label, command=command)
+            try:
+                atom.calc = calculator
+                atom.get_potential_energy()
+                break
+            except Exception as err:
+                self._close_calculator(calculator)
+                calculator = None
+                if restart == self.max_restarts:
+                    raise
+                log.warning(f"Restarting 'cp2k_shell' after: {err!r}")
+                if self.wfn_chaining:
+                    # e.g. the SCF did not converge from the previous wavefunction
+                    self._remove_wfn_restart(label)
+
+        atom.calc = ase.calculators.singlepoint.SinglePointCalculator(
+            atom, **calculator.results
         )
+        return calculator
 
-    def _move_cp2k_outs(self):
-        """The CP2K command is executed in the cwd.
-        Output files will be moved to NWD afterward."""
-        for file in pathlib.Path(".").glob("cp2k-RESTART.wfn*"):
-            file.rename(self.cp2k_output_dir / file)
+    def _get_workers(self) -> typing.List[dict]:
+        """The scratch directory, command and calculator of every worker
 
-        cp2k_inp = pathlib.Path("cp2k.inp")
-        cp2k_inp.rename(self.cp2k_output_dir / cp2k_inp)
+        A single worker writes directly to 'cp2k_output_dir'.
+        """
+        workers = []
+        for idx in range(self.n_workers):
+            if self.n_workers == 1:
+                directory = self.cp2k_output_dir
+            else:
+                directory = self.cp2k_output_dir / f"worker_{idx}"
+            directory.mkdir(parents=True, exist_ok=True)
+            if self.wfn_restart is not None:
+                # TODO maybe rename the file otherwise?
+                assert pathlib.Path(self.wfn_restart).name == "cp2k-RESTART.wfn"
+                shutil.copy(self.wfn_restart, directory)
+            workers.append(
+                {
+                    "label": (directory / "cp2k").as_posix(),
+                    "command": self.cp2k_shell.replace("{worker}", str(idx)),
+                    "index": idx,
+                    "calculator": None,
+                    "numbers": None,
+                }
+            )
+        return workers
 
-        cp2k_out = pathlib.Path("cp2k.out")
-        cp2k_out.rename(self.cp2k_output_dir / cp2k_out)
+    def _compute_with_worker(
+        self,
+        atom: ase.Atoms,
+        script: str,
+        workers: queue.Queue,
+        cache: CP2KCache,
+        dependencies: typing.List[str] = (),
+    ) -> typing.Tuple[ase.Atoms, typing.Optional[dict], dict]:
+        """Compute a frame in the session of the next idle worker
+
+        The worker is None if the results were served from the 'cache', which is
+        looked up with the 'get_final_input' and the md5 of the 'dependencies'. The
+        telemetry is a row of 'telemetry'.
+        """
+        start = time.perf_counter()
+        telemetry = {
+            "scf_iterations": np.nan,
+            "scf_converged": None,
+            "peak_rss_mb": np.nan,
+            "worker": -1,
+            "cached": False,
+        }
+        if cache is not None:
+            key = cache.get_key(atom, self.get_final_input(script), dependencies)
+            results = cache.get(key)
+            if results is not None:
+                atom.calc = ase.calculators.singlepoint.SinglePointCalculator(
+                    atom, **results
+                )
+                telemetry["cached"] = True
+                telemetry["wall_time"] = time.perf_counter() - start
+                return atom, None, telemetry
+
+        worker = workers.get()
+        output = pathlib.Path(f"{worker['label']}.out")
+        position = self._get_output_position(output)
+        with contextlib.suppress(AttributeError):
+            # a new session starts with its own peak
+            reset_peak_rss(worker["calculator"]._shell._child.pid)
+        try:
+            if (
+                self.wfn_chaining
+                and worker["numbers"] is not None
+                and not np.array_equal(atom.numbers, worker["numbers"])
+            ):
+                self._remove_wfn_restart(worker["label"])
+            worker["numbers"] = atom.numbers
+            # the session writes the restart file after every frame, so it also
+            # exists if the previous frame of a running session is reused
+            from_wfn = self.wfn_chaining and self._has_wfn_restart(worker["label"])
+            worker["calculator"] = self.compute(
+                atom,
+                script,
+                worker["calculator"],
+                label=worker["label"],
+                command=worker["command"],
+            )
+            telemetry.update(self._get_session_telemetry(worker, output, position))
+            if from_wfn and telemetry["scf_converged"] is False:
+                log.warning(
+                    "The SCF did not converge from the previous wavefunction,"
+                    " computing the frame again from the atomic guess."
+                )
+                self._close_calculator(worker["calculator"])
+                worker["calculator"] = None
+                self._remove_wfn_restart(worker["label"])
+                position = self._get_output_position(output)
+                worker["calculator"] = self.compute(
+                    atom, script, label=worker["label"], command=worker["command"]
+                )
+                telemetry.update(self._get_session_telemetry(worker, output, position))
+            telemetry["wall_time"] = time.perf_counter() - start
+            telemetry["worker"] = worker["index"]
+        finally:
+            workers.put(worker)
+        if cache is not None:
+            cache.put(key, atom.calc.results)
+        return atom, worker, telemetry
+
+    @staticmethod
+    def _get_output_position(output: pathlib.Path) -> typing.Tuple[int, bytes]:
+        """The size of the CP2K output and its last bytes to detect a new file"""
+        with contextlib.suppress(OSError):
+            with output.open("rb") as file:
+                offset = max(file.seek(0, io.SEEK_END) - 64, 0)
+                file.seek(offset)
+                return offset, file.read()
+        return 0, b""
+
+    @staticmethod
+    def _get_session_telemetry(
+        worker: dict, output: pathlib.Path, position: typing.Tuple[int, bytes]
+    ) -> dict:
+        """Parse the output of the last frame after 'position' and get the peak RSS"""
+        telemetry = {}
+        with contextlib.suppress(OSError):
+            with output.open("rb") as file:
+                offset, tail = position
+                file.seek(offset)
+                if file.read(len(tail)) != tail:
+                    # the output was replaced, e.g. by a new session
+                    file.seek(0)
+                text = file.read().decode(errors="replace")
+            iterations, converged = parse_scf_convergence(text)
+            telemetry.update(scf_iterations=iterations, scf_converged=converged)
+        with contextlib.suppress(AttributeError):
+            telemetry["peak_rss_mb"] = get_peak_rss(
+                worker["calculator"]._shell._child.pid
+            )
+        return telemetry
+
+    def get_final_input(self, script: str) -> str:
+        """The input that ASE sends to CP2K, apart from the project, coordinates and cell
+
+        All other options of the ASE calculator are disabled, see 'get_calculator'.
+        """
+        root = ase.calculators.cp2k.parse_input(script)
+        if self.stress_tensor:
+            root.add_keyword("FORCE_EVAL", "STRESS_TENSOR ANALYTICAL")
+            root.add_keyword("FORCE_EVAL/PRINT/STRESS_TENSOR", "_SECTION_PARAMETERS_ ON")
+        return "\n".join(root.write())
+
+    @staticmethod
+    def _is_same_frame(first: ase.Atoms, second: ase.Atoms) -> bool:
+        return (
+            np.array_equal(first.numbers, second.numbers)
+            and np.array_equal(first.pbc, second.pbc)
+            and np.array_equal(first.cell, second.cell)
+            and np.array_equal(first.positions, second.positions)
+        )
+
+    def get_dependency_md5s(self) -> typing.Dict[str, str]:
+        """The md5 of every file in 'dependencies', including files in directories"""
+        dependencies = self.dependencies or []
+        if isinstance(dependencies, (str, pathlib.Path)):
+            dependencies = [dependencies]
+        md5s = {}
+        for dependency in map(pathlib.Path, dependencies):
+            files = sorted(dependency.rglob("*")) if dependency.is_dir() else [dependency]
+            for file in files:
+                if file.is_file():
+                    md5s[file.as_posix()] = get_md5(file)
+        return md5s
+
+    def get_fingerprint(self, script: str) -> str:
+        """The md5 of everything besides 'atoms' that changes the computed frames
+
+        This covers the input script, the contents of the 'dependencies', e.g. the
+        basis set and potential files, 'stress_tensor' and 'wfn_chaining'.
+        """
+        inputs = {
+            "script": script,
+            "dependencies": self.get_dependency_md5s(),
+            "stress_tensor": self.stress_tensor,
+            "wfn_chaining": self.wfn_chaining,
+        }
+        return hashlib.md5(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def get_checkpoint(self, script: str) -> int:
+        """Number of frames in 'outputs' from a previous run that can be kept
+
+        The frames are kept up to the first one that differs from 'atoms' and only
+        if the 'get_fingerprint' is the same. All later rows are deleted.
+        """
+        file = type(self).outputs.get_filename(self)
+        if not file.exists():
+            return 0
+        database = ase.db.connect(file)
+        if database.metadata.get("cp2k_fingerprint") != self.get_fingerprint(script):
+            return 0
+
+        n_done = 0
+        # stop the prefetch thread and close the reader before deleting rows
+        with LazyAtomsSequence(file.as_posix()) as sequence, contextlib.closing(
+            iter(sequence)
+        ) as frames:
+            for done, atom in zip(frames, self.atoms):
+                if not self._is_same_frame(done, atom):
+                    break
+                n_done += 1
+        if n_done < len(database):
+            with database.managed_connection() as con:
+                ids = [x for (x,) in con.execute("SELECT id FROM systems ORDER BY id")]
+            database.delete(ids[n_done:])
+            # new rows continue the ids of the kept rows, see 'LazyAtomsSequence'
+            with database.managed_connection() as con:
+                con.execute(
+                    "UPDATE sqlite_sequence SET seq = ? WHERE name = 'systems'",
+                    (ids[n_done - 1] if n_done > 0 else 0,),
+                )
+        return n_done
+
+    def _iter_computed(
+        self, script: str, atoms: typing.Iterable[ase.Atoms], cache: CP2KCache = None
+    ) -> typing.Iterator[typing.Tuple[ase.Atoms, typing.Optional[dict], dict]]:
+        """Yield the computed frames, workers and telemetry in the order of 'atoms'
+
+        At most '2 * n_workers' frames are computed ahead of the consumer.
+        """
+        dependencies = []
+        if cache is not None:
+            dependencies = sorted(self.get_dependency_md5s().values())
+        workers = queue.Queue()
+        for worker in self._get_workers():
+            workers.put(worker)
+
+        try:
+            if self.n_workers == 1:
+                for atom in atoms:
+                    yield self._compute_with_worker(
+                        atom.copy(), script, workers, cache, dependencies
+                    )
+                return
+
+            def compute(atom: ase.Atoms) -> tuple:
+                return self._compute_with_worker(
+                    atom.copy(), script, workers, cache, dependencies
+                )
+
+            with concurrent.futures.ThreadPoolExecutor(self.n_workers) as executor:
+                results = iter_bounded(executor, compute, atoms, 2 * self.n_workers)
+                with contextlib.closing(results):
+                    yield from results
+        finally:
+            while not workers.empty():
+                calculator = workers.get()["calculator"]
+                if calculator is not None:
+                    self._close_calculator(calculator)
 
     @property
     def wfn_restart_file(self) -> pathlib.Path:
@@ -105,28 +730,71 @@ class CP2KNode(Node):
         return self.cp2k_output_dir / "cp2k-RESTART.wfn"
 
     def run(self):
-        if self.cp2k_output_dir.exists():
-            shutil.rmtree(self.cp2k_output_dir)
-        self.cp2k_output_dir.mkdir()
-
-        if self.wfn_restart is not None:
-            # TODO maybe rename the file otherwise?
-            assert pathlib.Path(self.wfn_restart).name == "cp2k-RESTART.wfn"
-            shutil.copy(self.wfn_restart, ".")
-
         with open(self.input_file, "r") as file:
             cp2k_input_dict = yaml.safe_load(file)
 
         cp2k_input_dict = self._remove_unwanted_entries(cp2k_input_dict)
+        if self.wfn_chaining:
+            cp2k_input_dict = self._set_scf_guess(cp2k_input_dict, "restart")
 
         cp2k_input_script = "\n".join(CP2KInputGenerator().line_iter(cp2k_input_dict))
 
-        self.outputs = []
-        for atom in self.atoms:
-            assert isinstance(atom, ase.Atoms)
-            atom = atom.copy()
-            atom.calc = self.get_calculator(cp2k_input_script)
-            atom.get_potential_energy()
-            self.outputs.append(atom)
+        n_done = self.get_checkpoint(cp2k_input_script)
+        if n_done == 0 and self.cp2k_output_dir.exists():
+            shutil.rmtree(self.cp2k_output_dir)
+        self.cp2k_output_dir.mkdir(parents=True, exist_ok=True)
+        if n_done > 0:
+            log.info(f"Resuming after {n_done} computed frames.")
+
+        # write every frame as soon as it is computed, 'outputs' only contains the
+        # frames of this run until it is saved
+        self.outputs = type(self).outputs.get_writer(
+            self, background=False, append=n_done > 0
+        )
+        ase.db.connect(self.outputs.file).metadata = {
+            "cp2k_fingerprint": self.get_fingerprint(cp2k_input_script)
+        }
+        if isinstance(self.atoms, LazyAtomsSequence):
+            atoms = self.atoms.view(n_done, None)
+        else:
+            atoms = itertools.islice(self.atoms, n_done, None)
+
+        cache = None
+        if self.cache_dir is not None:
+            cache = CP2KCache(
+                pathlib.Path(self.cache_dir).expanduser(), self.cache_max_bytes
+            )
+
+        last_worker, telemetry = None, []
+        try:
+            with contextlib.closing(
+                self._iter_computed(cp2k_input_script, atoms, cache)
+            ) as frames:
+                for frame, (atom, worker, row) in enumerate(frames, start=n_done):
+                    self.outputs.append(atom)
+                    last_worker = worker or last_worker
+                    telemetry.append({"frame": frame, **row})
+        finally:
+            self.outputs.close()
+            self.cache_info = {} if cache is None else cache.info()
+            if cache is not None:
+                cache.close()
+            self.telemetry = pd.DataFrame(
+                telemetry,
+                columns=[
+                    "frame",
+                    "wall_time",
+                    "scf_iterations",
+                    "scf_converged",
+                    "peak_rss_mb",
+                    "worker",
+                    "cached",
+                ],
+            )
+            self.telemetry.set_index("frame")
 
-        self._move_cp2k_outs()
+        if self.n_workers > 1 and last_worker is not None:
+            # the wavefunction of the last frame, e.g. for the next 'wfn_restart'
+            directory = pathlib.Path(last_worker["label"]).parent
+            for file in directory.glob("cp2k-RESTART.wfn*"):
+                shutil.copy(file, self.cp2k_output_dir)